@@ -4,4 +4,12 @@ from .towns import Town
 from .boards import Board
 from .actions import Action
 from .game import Game
-from .bots.rufus import Rufus
\ No newline at end of file
+
+
+def __getattr__(name: str):
+    # Optional modules are only imported when first used
+    if name == "Rufus":
+        from .bots.rufus import Rufus
+
+        return Rufus
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,24 +1,37 @@
 import random
-from copy import deepcopy
 from itertools import combinations, product
-from typing import Literal, Optional, Sequence, Union
+from types import MappingProxyType
+from typing import Iterable, Literal, Mapping, Optional, Sequence, Union
 
-from attr import asdict, define
+from attr import asdict, astuple, define, field
 
-from . import (BUILD_INFO, BUILDINGS, GOODS, LARGE_BUILDINGS, ROLES, TILES,
-               ActionType, Building, Good, PeopleHolder, PeopleAssignment, Role, ShipData, Tile,
+from . import (BUILD_INFO, BUILDINGS, GOOD_PRICES, GOODS, LARGE_BUILDINGS, NONPROD_BUILDINGS,
+               PRODUCTION_BUILDINGS, ROLES, TILES,
+               ActionType, Building, Good, PeopleHolder, Role, ShipData, Tile,
                Town, WorkplaceData)
 from .boards import Board
 
 
-class PeopleDistribution(list[PeopleAssignment]):
-    pass
+class PeopleDistribution(list[tuple[PeopleHolder, int]]):
+    """`(holder, amount)` pairs, home first. Vectors of amounts become pairs
+    with `MayorAction.from_vector`."""
+
+
+def to_distribution(data: Optional[Iterable]) -> Optional[PeopleDistribution]:
+    """Pairs as tuples, so that pairs from JSON lists compare and hash alike."""
+    if data is None or isinstance(data, PeopleDistribution):
+        return data
+    return PeopleDistribution((holder, amount) for holder, amount in data)
 
 
 class GameOver(Exception):
     pass
 
 
+class IllegalAction(ValueError):
+    """A submitted action that is not one of the possibilities of the expected one."""
+
+
 @define
 class Action:
     name: str
@@ -28,9 +41,23 @@ class Action:
     def possibilities(self, board: Board, **kwargs) -> Sequence["Action"]:
         raise NotImplementedError
 
-    def react(self, board: Board) -> tuple[Board, Sequence["Action"]]:
+    def react(self, board: Board, trusted: bool = False) -> tuple[Board, Sequence["Action"]]:
+        """Apply the action to the board, and return the actions that follow.
+
+        Actions from `possibilities` are legal by construction: `trusted`
+        skips the checks that they pass anyway, and any defensive copy.
+        """
         raise NotImplementedError
 
+    def key(self) -> tuple:
+        """A hashable copy of the action, to look it up in sets of possibilities."""
+        return tuple(
+            tuple(tuple(item) if isinstance(item, (list, tuple)) else item for item in value)
+            if isinstance(value, list)
+            else value
+            for value in astuple(self, recurse=False)
+        )
+
 
 @define
 class GovernorAction(Action):
@@ -43,7 +70,7 @@ class GovernorAction(Action):
     def possibilities(self, board: Board, **kwargs):
         return [self]
 
-    def react(action, board: Board) -> tuple[Board, Sequence[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, Sequence[Action]]:
         board.set_governor(action.name)
         extra = [RoleAction(name=name) for name in board.round_from(action.name)]
         extra += [GovernorAction(name=board.next_to(action.name))]
@@ -62,7 +89,8 @@ class GovernorAction(Action):
             #     TerminateAction(name=action.name, reason="Not enough money for roles.")
             # ]
         if board.endgame_reason:
-            raise GameOver(board.endgame_reason)
+            # Game over: leave the queue empty, the game is now terminal
+            return board, []
 
         return board, extra
 
@@ -83,14 +111,14 @@ class RoleAction(Action):
             if data.available
         ]
 
-    def react(action, board: Board) -> tuple[Board, Sequence[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, Sequence[Action]]:
         town = board.towns[action.name]
         role = action.role
 
         assert role is not None, f"{action!r} is not complete."
         assert town.role is None, f"Player {town.name} already has role ({town.role})."
 
-        board.give_role(role, to=town)
+        board.give_role(role, to=town, checked=not trusted)
         extra: Sequence[Action] = []
 
         if role == "settler":
@@ -115,7 +143,7 @@ class RoleAction(Action):
             extra = [BuilderAction(name=name) for name in board.round_from(town.name)]
         elif role == "craftsman":
             for some_town in board.town_round_from(town.name):
-                for good, amount in some_town.production().items():
+                for good, amount in zip(GOODS, some_town.production_vector()):
                     possible_amount = min(amount, board.count(good))
                     board.give(possible_amount, good, to=some_town)
             extra = [CraftsmanAction(name=town.name)]
@@ -173,7 +201,7 @@ class StorageAction(Action):
         stored = [g for g in stored if g in GOODS]
         return f"{self.name}.store({str(', ').join(stored)})"
 
-    def react(action, board: Board) -> tuple[Board, list[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, list[Action]]:
         town = board.towns[action.name]
 
         for good in GOODS:
@@ -324,7 +352,7 @@ class TidyupAction(Action):
     def __str__(self):
         return f"{self.name}.tidyup()"
 
-    def react(action, board: Board) -> tuple[Board, Sequence[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, Sequence[Action]]:
         extra = []
 
         # Check if enough tiles are revealed
@@ -336,10 +364,7 @@ class TidyupAction(Action):
 
         # Eventually refill people_ship
         if board.people_ship <= 0:
-            total_jobs = sum(
-                town.count_vacant_building_jobs() for town in board.towns.values()
-            )
-            total_jobs = max(total_jobs, len(board.towns))  # At least one per player
+            total_jobs = max(board.vacant_building_jobs, len(board.towns))  # At least one per player
             if board.count("people") >= total_jobs:
                 board.people_ship = board.pop("people", total_jobs)
             else:
@@ -407,15 +432,15 @@ class BuilderAction(Action):
             for (type, extra) in product(type_possibilities, extra_person_possibilities)
         ]
 
-    def react(action, board: Board):
+    def react(action, board: Board, trusted: bool = False):
         town = board.towns[action.name]
         # assert action.building_type is not None, f"Action {action} is not complete."
         if action.building_type is None:
             return board, []
 
-        board.give_building(action.building_type, to=town)
+        board.give_building(action.building_type, to=town, checked=not trusted)
         if action.extra_person:
-            assert (
+            assert trusted or (
                 town.privilege("university") and board.people > 0
             ), "Can't ask for extra worker"
             board.people -= 1
@@ -423,7 +448,7 @@ class BuilderAction(Action):
 
         extra = []
         # Stop for building space
-        if town.count_free_build_space() == 0:
+        if town.count_free_build_space() == 0:  # Only the builder's space changed
             # extra.append(
             #     TerminateAction(
             #         name=action.name, reason="Game over: no more real estate."
@@ -495,7 +520,7 @@ class CaptainAction(Action):
 
         return actions
 
-    def react(action, board: Board) -> tuple[Board, Sequence[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, Sequence[Action]]:
         town = board.towns[action.name]
         ship_size = action.selected_ship
         good = action.selected_good
@@ -506,7 +531,7 @@ class CaptainAction(Action):
 
         # Want to use wharf
         if ship_size == 11:
-            assert (
+            assert trusted or (
                 town.privilege("wharf") and not town.spent_wharf
             ), "Player does not have a free wharf."
 
@@ -522,11 +547,11 @@ class CaptainAction(Action):
             board.give(points, "points", to=town, makable=True)
 
         else:
-            assert board.ship_accept(
+            assert trusted or board.ship_accept(
                 ship_size=ship_size, good=good
             ), f"Ship {ship_size} cannot accept {good}."
 
-            amount = board.goods_fleet[ship_size].amount
+            amount = board.goods_fleet.amount(ship_size)
             given_amount = min(ship_size - amount, town.count(good))
 
             board.load_cargo(town.pop(good, given_amount), good, ship_size)
@@ -554,14 +579,14 @@ class CraftsmanAction(Action):
     def __str__(self):
         return f"{self.name}.supercraft({self.selected_good})"
 
-    def react(action, board: Board) -> tuple[Board, list[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, list[Action]]:
         good = action.selected_good
         town = board.towns[action.name]
         # assert good is not None, "Action is not complete."
         if good is None:
             return board, []
         
-        assert (
+        assert trusted or (
             town.production(good) > 0
         ), f"Craftsman get one extra good of something he produces, not {good}."
 
@@ -572,8 +597,8 @@ class CraftsmanAction(Action):
     def possibilities(self, board: Board, **kwargs) -> Sequence["CraftsmanAction"]:
         town = board.towns[self.name]
         actions = list()
-        for selected_good in GOODS:
-            if town.production(selected_good) > 0 and board.has(selected_good):
+        for selected_good, amount in zip(GOODS, town.production_vector()):
+            if amount > 0 and board.has(selected_good):
                 actions.append(
                     CraftsmanAction(name=town.name, selected_good=selected_good)
                 )
@@ -583,7 +608,7 @@ class CraftsmanAction(Action):
 
 @define
 class MayorAction(Action):
-    people_distribution: Optional[PeopleDistribution] = None
+    people_distribution: Optional[PeopleDistribution] = field(default=None, converter=to_distribution)
     type: Literal["mayor"] = "mayor"
     priority: int = 5
 
@@ -595,75 +620,155 @@ class MayorAction(Action):
         )
         return f"{self.name}.mayor({occupations})"
 
-    def react(action, board: Board) -> tuple[Board, list[Action]]:
+    @staticmethod
+    def holders(town: Town) -> list[PeopleHolder]:
+        """Where people can work, after home: placed tiles, then placed buildings."""
+        return [*town.placed_tiles(), *town.placed_buildings()]
+
+    @classmethod
+    def from_vector(cls, town: Town, amounts: Sequence[int]) -> "MayorAction":
+        """The action of a vector of people: home first, then one amount per holder."""
+        holders: list[PeopleHolder] = ["home", *cls.holders(town)]
+        if len(holders) != len(amounts):
+            raise ValueError(f"Distribution {amounts} doesn't match {holders}.")
+        return cls(name=town.name, people_distribution=PeopleDistribution(zip(holders, amounts)))
+
+    def distribution_error(self, town: Town) -> Optional[str]:
+        """Why the distribution can't be played in the town, or None if it can."""
+        if not self.people_distribution:
+            return "Action is incomplete."
+        (first_holder, people_at_home), *assignments = self.people_distribution
+        tiles, buildings = town.placed_tiles(), town.placed_buildings()
+        if first_holder != "home":
+            return "Need to now how many worker stay home."
+        if [holder for holder, _ in assignments] != [*tiles, *buildings]:
+            return f"There should be assignments for every tile/building exactly. Got {assignments}"
+        amounts = [amount for _, amount in assignments]
+        if not all(type(amount) is int for amount in (people_at_home, *amounts)):
+            return f"Amounts of people should be integers. Got {self.people_distribution}"
+        if people_at_home < 0:
+            return "Negative people at home."
+        for tile, amount in zip(tiles, amounts):
+            if not 0 <= amount <= town.tiles[tile].placed:
+                return f"Wrong assignment: {amount} to {tile}."
+        for building, amount in zip(buildings, amounts[len(tiles) :]):
+            if not 0 <= amount <= BUILD_INFO[building]["space"]:
+                return f"Wrong assignment: {amount} to {building}."
+        if people_at_home + sum(amounts) != town.count_total_people():
+            return "Wrong total of people."
+        return None
+
+    def check(self, board: Board):
+        """Raise IllegalAction unless the action is one of `possibilities`.
+
+        The distributions are too many to list for a check: this takes the
+        checks of `react`, and that people stay home only when every job is taken.
+        """
+        town = board.towns[self.name]
+        error = self.distribution_error(town)
+        if error is None:
+            people_at_home = self.people_distribution[0][1]  # type: ignore
+            if people_at_home != max(0, town.count_total_people() - town.count_total_jobs()):
+                error = f"{people_at_home} people stay home, for {town.count_total_jobs()} jobs."
+        if error is not None:
+            raise IllegalAction(f"Action {self} is not possible: {error}")
+
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, list[Action]]:
         town = board.towns[action.name]
-        assert action.people_distribution is not None, "Action is incomplete."
-
-        updated_town = deepcopy(town)
-        (first_holder, people_at_home), *assignments = action.people_distribution
-        holders = updated_town.placed_tiles() + updated_town.placed_buildings()
-        assert first_holder == "home", "Need to now how many worker stay home."
-        assert len(assignments) == len(
-            holders
-        ), f"There should be assignments for every tile/building exactly. Got {assignments} for {holders}"
-
-        updated_town.people = people_at_home
-        worked_tiles = {tile: 0 for tile in TILES}
-        worked_buildings = {building: 0 for building in updated_town.buildings}
-        for (holder_type, amount), holder in zip(assignments, holders):
-            assert holder_type == holder, f"Wrong assignment: {holder_type} to {holder}"
-
-            if holder in BUILDINGS:
-                worked_buildings[holder] += amount
-            elif holder in TILES:
-                worked_tiles[holder] += amount
-
-        for tile, (placed, _) in town.tiles.items():
-            updated_town.tiles[tile] = WorkplaceData(placed, worked_tiles[tile])
-
-        for building, (placed, _) in town.buildings.items():
-            updated_town.buildings[building] = WorkplaceData(
-                placed, worked_buildings[building]
-            )
+        if not trusted:
+            error = action.distribution_error(town)
+            assert error is None, error
+
+        (_, people_at_home), *assignments = action.people_distribution  # type: ignore
+        tiles, buildings = town.placed_tiles(), town.placed_buildings()
+        amounts = [amount for _, amount in assignments]
+        # Only touch the holders whose workers change
+        town.people = people_at_home
+        for tile, amount in zip(tiles, amounts):
+            placed, worked = town.tiles[tile]
+            if worked != amount:
+                town.tiles[tile] = WorkplaceData(placed, amount)
+        for building, amount in zip(buildings, amounts[len(tiles) :]):
+            placed, worked = town.buildings[building]
+            if worked != amount:
+                town.buildings[building] = WorkplaceData(placed, amount)
+        return board, []
 
-        assert (
-            updated_town.count_total_people() == town.count_total_people()
-        ), "Wrong total of people."
+    def features(self, town: Town) -> tuple[int, ...]:
+        """What a distribution is worth: production, privileges and scoring.
 
-        board.towns[town.name] = updated_town
-        return board, []
+        The production of every good, the useful quarries, the privileges of the
+        placed non-production buildings and the residence bonus all increase
+        with a better distribution.
+        """
+        worked = dict(self.people_distribution or [])
+        production = []
+        for good in GOODS:
+            raw_production = worked.get(f"{good}_tile", 0)
+            if good != "corn":
+                workers = sum(worked.get(b, 0) for b in PRODUCTION_BUILDINGS[good])
+                raw_production = min(raw_production, workers)
+            production.append(raw_production)
+        quarries = min(4, worked.get("quarry_tile", 0))  # The highest tier is 4
+        privileges = [
+            int(worked.get(building, 0) >= BUILD_INFO[building]["space"])
+            for building in NONPROD_BUILDINGS
+            if town.buildings[building].placed > 0
+        ]
+        residence = 0
+        if worked.get("residence", 0) > 0:
+            residence = max(4, sum(worked.get(tile, 0) for tile in TILES) - 5)
+        return (*production, quarries, *privileges, residence)
 
-    def possibilities(self, board: Board, cap=None, **kwargs) -> list["MayorAction"]:
+    def prune_dominated(self, board: Board, actions: list["MayorAction"]) -> list["MayorAction"]:
+        """Keep one distribution for each set of features that no other one beats.
+
+        This disregards the effect of vacant building jobs on the people ship.
+        """
         town = board.towns[self.name]
-        people, space = town.count_total_people(), town.count_total_jobs()
-        holders = [
-            "home",
-            *town.placed_tiles(),
-            *town.placed_buildings(),
+        by_features: dict[tuple[int, ...], MayorAction] = {}
+        for action in sorted(actions, key=lambda a: list(a.people_distribution or [])):
+            by_features.setdefault(action.features(town), action)
+        return [
+            action
+            for features, action in by_features.items()
+            if not any(
+                other != features and all(o >= f for o, f in zip(other, features))
+                for other in by_features
+            )
         ]
 
+    def reduction(self, board: Board, **kwargs) -> tuple[int, int]:
+        """How many distributions are left by pruning, out of how many."""
+        actions = self.possibilities(board, **kwargs)
+        return len(self.prune_dominated(board, actions)), len(actions)
+
+    def possibilities(
+        self,
+        board: Board,
+        cap=None,
+        rng: Optional[random.Random] = None,
+        prune: bool = False,
+        **kwargs,
+    ) -> list["MayorAction"]:
+        town = board.towns[self.name]
+        people, space = town.count_total_people(), town.count_total_jobs()
+        tiles, buildings = town.placed_tiles(), town.placed_buildings()
+        holders: list[PeopleHolder] = ["home", *tiles, *buildings]
+        capacities = (
+            0,
+            *(town.tiles[tile].placed for tile in tiles),
+            *(BUILD_INFO[building]["space"] for building in buildings),
+        )
+
         if people >= space:
-            dist = tuple(
-                (
-                    people - space
-                    if key == "home"
-                    else (town.tiles[key].placed if key in TILES else BUILD_INFO[key]["space"])  # type: ignore
-                )
-                for key in holders
-            )
+            dist = (people - space, *capacities[1:])
             return [
-                MayorAction(
-                    name=town.name,
-                    people_distribution=list(zip(holders, dist)),  # type: ignore
-                )
+                MayorAction(name=town.name, people_distribution=PeopleDistribution(zip(holders, dist)))
             ]
         else:
-            dist = tuple(
-                0 if key == "home" else (town.tiles[key].placed if key in TILES else BUILD_INFO[key]["space"])  # type: ignore
-                for key in holders
-            )
-            distributions = {dist}
-            total_people_in_new_dist = sum(dist)
+            distributions = {capacities}
+            total_people_in_new_dist = sum(capacities)
         while total_people_in_new_dist > people:
             new_distributions = set()
             for dist in distributions:
@@ -675,14 +780,17 @@ class MayorAction(Action):
 
             total_people_in_new_dist -= 1
             if cap and cap < len(new_distributions):
-                distributions = random.sample(sorted(new_distributions), cap)
+                distributions = (rng or random).sample(sorted(new_distributions), cap)
             else:
                 distributions = new_distributions
 
-        return [
-            MayorAction(name=town.name, people_distribution=list(zip(holders, dist)))  # type: ignore
+        actions = [
+            MayorAction(name=town.name, people_distribution=PeopleDistribution(zip(holders, dist)))
             for dist in distributions
         ]
+        if prune:
+            actions = self.prune_dominated(board, actions)
+        return actions
 
 
 @define
@@ -696,27 +804,28 @@ class SettlerAction(Action):
     def __str__(self):
         return f"{self.name}.settler({self.tile}{' +downtile' if self.down_tile else ''}{' +worker' if self.extra_person else ''})"
 
-    def react(action, board: Board) -> tuple[Board, list[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, list[Action]]:
         town: Town = board.towns[action.name]
 
         # assert action.tile is not None, "Action is not complete"
         if action.tile is None:
             return board, []
         
-        assert not action.down_tile or town.privilege(
-            "hacienda"
-        ), "Can't take down tile without occupied hacienda."
-        assert not action.extra_person or town.privilege(
-            "hospice"
-        ), "Can't take extra person without occupied hospice."
-        assert (
-            action.tile != "quarry_tile"
-            or town.role == "settler"
-            or town.privilege("construction_hut")
-        ), "Only the settler can pick a quarry"
-        assert (
-            sum(data.placed for data in town.tiles.values()) < 12
-        ), "At most 12 tile per player."
+        if not trusted:
+            assert not action.down_tile or town.privilege(
+                "hacienda"
+            ), "Can't take down tile without occupied hacienda."
+            assert not action.extra_person or town.privilege(
+                "hospice"
+            ), "Can't take extra person without occupied hospice."
+            assert (
+                action.tile != "quarry_tile"
+                or town.role == "settler"
+                or town.privilege("construction_hut")
+            ), "Only the settler can pick a quarry"
+            assert (
+                sum(data.placed for data in town.tiles.values()) < 12
+            ), "At most 12 tile per player."
 
         tile_index = TILES.index(action.tile)
         board.give_tile(to=town, type=action.tile)
@@ -742,7 +851,7 @@ class SettlerAction(Action):
                 town.role == "settler" or town.privilege("construction_hut")
             ):
                 tiletypes.add("quarry_tile")
-            for tile_type in tiletypes:
+            for tile_type in sorted(tiletypes):
                 actions.append(SettlerAction(name=town.name, tile=tile_type))
                 if town.privilege("hacienda") and town.privilege("hospice"):
                     actions.append(
@@ -774,20 +883,19 @@ class TraderAction(Action):
     def __str__(self):
         return f"{self.name}.trade({self.selected_good})"
 
-    def react(action, board: Board) -> tuple[Board, list[Action]]:
+    def react(action, board: Board, trusted: bool = False) -> tuple[Board, list[Action]]:
         good = action.selected_good
         town = board.towns[action.name]
         # assert good is not None, "Action is not complete"
         if good is None:
             return board, []
 
-        assert (
-            sum(board.market.count(g) for g in GOODS) < 4
-        ), "There is no more space in the market."
-        assert board.market.count(good) == 0 or town.privilege(
-            "office"
-        ), f"There already is {good} in the market."
-        price = dict(corn=0, indigo=1, sugar=2, tobacco=3, coffee=4)[good]
+        if not trusted:
+            assert not board.market.is_full(), "There is no more space in the market."
+            assert board.market.count(good) == 0 or town.privilege(
+                "office"
+            ), f"There already is {good} in the market."
+        price = GOOD_PRICES[good]
         price += 1 if town.role == "trader" else 0
         price += 1 if town.privilege("small_market") else 0
         price += 2 if town.privilege("large_market") else 0
@@ -800,13 +908,25 @@ class TraderAction(Action):
     def possibilities(self, board: Board, **kwargs) -> Sequence["TraderAction"]:
         town = board.towns[self.name]
         actions = [TraderAction(name=town.name)]
-        if sum(board.market.count(g) for g in GOODS) >= 4:
+        market = board.market
+        if market.is_full():
             return actions
-        for selected_good in [good for good in GOODS if town.has(good)]:
-            if board.market.count(selected_good) == 0 or town.privilege("office"):  # type: ignore
-                actions = actions + [
-                    TraderAction(
-                        name=town.name, selected_good=selected_good  # type: ignore
-                    )
-                ]
+        office = town.privilege("office")
+        for selected_good, count in zip(GOODS, market.counts):
+            if town.has(selected_good) and (count == 0 or office):
+                actions.append(TraderAction(name=town.name, selected_good=selected_good))
         return actions
+
+
+ACTION_CLASSES: Mapping[str, type[Action]] = MappingProxyType({
+    "builder": BuilderAction,
+    "captain": CaptainAction,
+    "craftsman": CraftsmanAction,
+    "governor": GovernorAction,
+    "mayor": MayorAction,
+    "role": RoleAction,
+    "settler": SettlerAction,
+    "storage": StorageAction,
+    "tidyup": TidyupAction,
+    "trader": TraderAction,
+})
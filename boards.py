@@ -1,19 +1,45 @@
+import functools
 import itertools
 import random
 from typing import Iterator, Optional, Sequence, Union
 
-from attr import define
+from attr import define, field, setters
 
+from .cargo import Fleet, Market, to_fleet, to_market
+from .counters import Counters
 from .holders import Holder
+from .journal import Journal, journaled
 
 from .constants import *
 from .towns import Town
-from .utils import RoleData, ShipData, WorkplaceData, bin_extend, bin_mod
+from .utils import RoleData, ShipData, WorkplaceData, bin_extend, bin_mod, shallow_copy
 
+# Plantation tiles of a new game, before shuffling
+STARTING_TILES: tuple[Tile, ...] = tuple(
+    tile for tile, amount in TILE_INFO.items() for _ in range(amount)
+)
 
-@define
+
+def starting_tiles(players: int) -> tuple[Tile, ...]:
+    """The tiles that the players get at setup, in play order."""
+    num_indigo = 2 if players < 5 else 3
+    return tuple("indigo_tile" if i < num_indigo else "corn_tile" for i in range(players))
+
+
+def recounted(board: "Board", attribute, towns: dict[str, Town]) -> dict[str, Town]:
+    """`on_setattr` hook of the towns: new towns are counted again on first use."""
+    counters = board._counters
+    if counters is not None and (
+        len(towns) != sum(counters.free_spaces.values())
+        or any(town.counters is not counters for town in towns.values())
+    ):
+        board._counters = None
+    return towns
+
+
+@define(on_setattr=[setters.convert, journaled])
 class Board(Holder):
-    towns: dict[str, Town]
+    towns: dict[str, Town] = field(on_setattr=[setters.convert, journaled, recounted])
 
     money: int
     people: int
@@ -26,8 +52,8 @@ class Board(Holder):
 
     roles: dict[Role, RoleData]
 
-    goods_fleet: dict[int, ShipData]
-    market: list[Good]
+    goods_fleet: Fleet = field(converter=to_fleet)  # Also accepts a dict of ShipData
+    market: Market = field(converter=to_market)  # Also accepts a list of goods
     people_ship: int
     unbuilt: dict[Building, int]
     unsettled_quarries: int
@@ -36,11 +62,40 @@ class Board(Holder):
 
     endgame_reason: Optional[str] = None
 
+    # Running counters for the refill and endgame checks, attached on first use
+    _counters: Optional[Counters] = field(
+        default=None, init=False, eq=False, repr=False, on_setattr=setters.NO_OP
+    )
+    journal: Optional[Journal] = field(
+        default=None, init=False, eq=False, repr=False, on_setattr=setters.NO_OP
+    )
+
     def __getitem__(self, name: str):
         return self.towns[name]
 
+    def counters(self) -> Counters:
+        """The running counters, kept up to date by the towns and their buildings."""
+        counters = self._counters
+        if counters is None:
+            counters = self._counters = Counters(self.towns.values())
+        return counters
+
+    @property
+    def vacant_building_jobs(self) -> int:
+        """For the refill of the people ship."""
+        return self.counters().vacant_building_jobs
+
+    @property
+    def min_free_build_space(self) -> int:
+        """For the endgame: a town without space ends the game."""
+        return self.counters().min_free_build_space
+
+    @property
+    def towns_with_role(self) -> int:
+        return self.counters().towns_with_role
+
     @classmethod
-    def new(cls, names: Sequence[str], shuffle_tiles=True):
+    def new(cls, names: Sequence[str], shuffle_tiles=True, rng: Optional[random.Random] = None):
         assert 3 <= len(names) <= 5, "Players must be between 3 and 5."
 
         game_data = {}
@@ -63,19 +118,15 @@ class Board(Holder):
 
         # Generate role cards
         game_data["roles"] = {
-            r: RoleData(int(i < len(names) + 3), 0)
-            for i in range(8)
-            for i, r in enumerate(ROLES)
+            r: RoleData(int(i < len(names) + 3), 0) for i, r in enumerate(ROLES)
         }
 
         # Generate tiles
         game_data["unsettled_quarries"] = 8
         game_data["unsettled_tiles"] = list()
-        game_data["exposed_tiles"] = list(
-            sum(([tile] * amount for tile, amount in TILE_INFO.items()), start=[])
-        )
+        game_data["exposed_tiles"] = list(STARTING_TILES)
         if shuffle_tiles:
-            random.shuffle(game_data["exposed_tiles"])
+            (rng or random).shuffle(game_data["exposed_tiles"])
 
         # Generate buildings
         game_data["unbuilt"] = {
@@ -91,23 +142,70 @@ class Board(Holder):
             town.money += amount
 
         # Distribute tiles
-        num_indigo = 2 if len(names) < 5 else 3
-        for i, player_name in enumerate(names):
-            player = self.towns[player_name]
-            self.give_tile(
-                to=player, type="indigo_tile" if i < num_indigo else "corn_tile"
-            )
+        for player_name, tile in zip(names, starting_tiles(len(names))):
+            self.give_tile(to=self.towns[player_name], type=tile)
         self.expose_tiles()
         
         return self
 
+    @classmethod
+    def from_template(cls, names: Sequence[str], shuffle_tiles=True, rng: Optional[random.Random] = None):
+        """Same as `Board.new`, from a copy of the template board of as many players."""
+        assert 3 <= len(names) <= 5, "Players must be between 3 and 5."
+        tiles = list(STARTING_TILES)
+        if shuffle_tiles:
+            (rng or random).shuffle(tiles)
+        for tile in starting_tiles(len(names)):
+            tiles.remove(tile)
+
+        self = board_template(len(names)).copy()
+        towns = list(self.towns.values())
+        for name, town in zip(names, towns):
+            town.name = name
+        self.towns = dict(zip(names, towns))
+        self.exposed_tiles = tiles[: len(names) + 1]
+        self.unsettled_tiles = tiles[len(names) + 1 :]
+        return self
+
+    def copy(self) -> "Board":
+        """A copy of the board and its towns, much faster than `deepcopy`.
+
+        Role and workplace entries are shared: they are replaced, never changed.
+        """
+        board = shallow_copy(self)
+        for name, value in (
+            ("towns", {name: town.copy() for name, town in self.towns.items()}),
+            ("roles", dict(self.roles)),
+            ("goods_fleet", self.goods_fleet.copy()),
+            ("market", self.market.copy()),
+            ("unbuilt", dict(self.unbuilt)),
+            ("exposed_tiles", self.exposed_tiles[:]),
+            ("unsettled_tiles", self.unsettled_tiles[:]),
+            ("journal", None),
+            ("_counters", None),
+        ):
+            object.__setattr__(board, name, value)
+        if self._counters is not None:
+            board._counters = self._counters.copy(zip(self.towns.values(), board.towns.values()))
+        return board
+
+    def __deepcopy__(self, memo: dict) -> "Board":
+        # Register the towns as well, for whatever else refers to them
+        board = memo[id(self)] = self.copy()
+        for name, town in self.towns.items():
+            memo[id(town)] = board.towns[name]
+        return board
+
+    def journal_path(self) -> tuple[str, ...]:
+        return ()
+
     def asdict(self):
         data = dict()
 
-        for role, data in self.roles.items():
-            data[f"{role} is available"] = data.available
+        for role, role_data in self.roles.items():
+            data[f"{role} is available"] = role_data.available
 
-            bin_extend(data, f"{role} money", data.money, sup=7)
+            bin_extend(data, f"{role} money", role_data.money, sup=7)
 
         bin_extend(data, "money", self.money, sup=60)
         bin_extend(data, "people", self.people, sup=100)
@@ -139,15 +237,14 @@ class Board(Holder):
         return data
 
     def empty_ships_and_market(self):
-        for size, data in self.goods_fleet.items():
-            if data.type and data.amount >= size:
-                self.goods_fleet[size] = ShipData(size, None, 0)
-                self.add(data.type, data.amount)
-        market_total = len(self.market)
-        if market_total >= 4:
-            for data.type in self.market:
-                self.add(data.type, 1)
-            self.market = []
+        for good, amount in self.goods_fleet.unload_full():
+            self.add(good, amount)
+        market = self.market
+        if market.is_full():
+            for good, count in zip(GOODS, market.counts):
+                if count:
+                    self.add(good, count)
+            market.clear()
 
     def expose_tiles(self):
         tiles = self.unsettled_tiles + self.exposed_tiles
@@ -155,7 +252,7 @@ class Board(Holder):
         self.exposed_tiles = tiles[: len(self.towns) + 1]
         self.unsettled_tiles = tiles[len(self.towns) + 1 :]
 
-    def give_building(self, building_type: Building, *, to: Union[Town, str]):
+    def give_building(self, building_type: Building, *, to: Union[Town, str], checked: bool = True):
         if isinstance(to, str):
             town = self.towns[to]
         else:
@@ -167,18 +264,21 @@ class Board(Holder):
         quarries_discount = min(tier, town.count_active_quarries())
         builder_discount = 1 if town.role == "builder" else 0
         price = max(0, cost - quarries_discount - builder_discount)
-        assert town.money >= price, f"Player does not have enough money."
-        assert (
-            self.unbuilt[building_type] > 0
-        ), f"There are no more {building_type} to sell."
-        assert town.count_free_build_space() >= (
-            2 if tier == 4 else 1
-        ), f"Town of {town.name} does not have space for {building_type}"
-        assert (
-            town.buildings[building_type].placed == 0
-        ), f"Town of {town.name} already has a {building_type}"
+        if checked:
+            assert town.money >= price, f"Player does not have enough money."
+            assert (
+                self.unbuilt[building_type] > 0
+            ), f"There are no more {building_type} to sell."
+            assert town.count_free_build_space() >= (
+                2 if tier == 4 else 1
+            ), f"Town of {town.name} does not have space for {building_type}"
+            assert (
+                town.buildings[building_type].placed == 0
+            ), f"Town of {town.name} already has a {building_type}"
 
         self.unbuilt[building_type] -= 1
+        if self.journal is not None:
+            self.journal.note(("unbuilt",), building_type)
         town.buildings[building_type] = WorkplaceData(1, 0)
         town.money -= price
         self.money += price
@@ -188,6 +288,8 @@ class Board(Holder):
         assert to.count_tiles() < 12, "No more space to place a tile."
 
         type = self.unsettled_tiles.pop(0)
+        if self.journal is not None:
+            self.journal.note((), "unsettled_tiles")
         placed, worked = to.tiles[type]
         to.tiles[type] = WorkplaceData(placed + 1, worked)
 
@@ -201,6 +303,8 @@ class Board(Holder):
             assert to.count_tiles() < 12, "No more space to place a quarry."
 
             self.exposed_tiles.remove(type)
+            if self.journal is not None:
+                self.journal.note((), "exposed_tiles")
             placed, worked = to.tiles[type]
             to.tiles[type] = WorkplaceData(placed + 1, worked)
 
@@ -211,16 +315,19 @@ class Board(Holder):
         placed, worked = to.tiles["quarry_tile"]
         to.tiles["quarry_tile"] = WorkplaceData(placed + 1, worked)
 
-    def give_role(self, role: Role, *, to: Town):
-        assert to.role is None, f"Player {to} already as role {to.role}."
-        assert role in ROLES, f"Role {role} is not available."
+    def give_role(self, role: Role, *, to: Town, checked: bool = True):
+        if checked:
+            assert to.role is None, f"Player {to} already as role {to.role}."
+            assert role in ROLES, f"Role {role} is not available."
 
-        assert role in self.roles, f"Role {role} is not available."
-        assert self.roles[role].available, f"Role {role} is not available."
+            assert role in self.roles, f"Role {role} is not available."
+            assert self.roles[role].available, f"Role {role} is not available."
 
         to.role = role
         to.money += self.roles[role].money
         self.roles[role] = RoleData(False, 0)
+        if self.journal is not None:
+            self.journal.note(("roles",), role)
     
     def get_governor_name(self) -> Optional[str]:
         for name, town in self.towns.items():
@@ -228,11 +335,10 @@ class Board(Holder):
                 return name
 
     def is_end_of_round(self):
-        return all((town.role is not None) for town in self.towns.values())
+        return self.towns_with_role == len(self.towns)
 
     def load_cargo(self, amount: int, type: Good, size: int):
-        prev_amount = self.goods_fleet[size].amount
-        self.goods_fleet[size] = ShipData(size, type, prev_amount + amount)
+        self.goods_fleet.load(size, type, amount)
 
     def next_to(self, name: str) -> str:
         cycle = itertools.cycle(self.towns)
@@ -249,6 +355,8 @@ class Board(Holder):
                 self.roles[role] = RoleData(True, data.money + 1)
             else:
                 self.roles[role] = RoleData(i < len(self.towns) + 3, 0)
+            if self.journal is not None:
+                self.journal.note(("roles",), role)
 
         # Set town roles to None
         for town in self.towns.values():
@@ -276,12 +384,13 @@ class Board(Holder):
             town.gov = owner == name
 
     def ship_accept(self, ship_size, good) -> bool:
-        for size, data in self.goods_fleet.items():
-            if size != ship_size and data.type == good:
-                return False
-        if self.goods_fleet[ship_size].amount == 0:
-            return True
-        elif self.goods_fleet[ship_size].type != good:
-            return False
-        else:
-            return self.goods_fleet[ship_size].amount < ship_size
+        return self.goods_fleet.accepts(ship_size, good)
+
+
+@functools.lru_cache(maxsize=None)
+def board_template(players: int) -> Board:
+    """The board of a new game before the tiles are shuffled, with the towns named by seat.
+
+    Shared by every caller: copy it, never change it.
+    """
+    return Board.new([f"#{seat}" for seat in range(players)], shuffle_tiles=False)
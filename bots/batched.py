@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, Optional
+
+import numpy as np
+
+from .. import Action
+from ..encoding import indexed_possibilities, legal_mask, observation
+from ..game import Game
+
+# Takes observations (batch, observation_size) and legal masks (batch, NUM_ACTIONS),
+# returns scores (batch, NUM_ACTIONS)
+Model = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+class InferenceStopped(RuntimeError):
+    """Set on the requests still queued when `BatchedInference.stop` is called."""
+
+
+class BatchedInference:
+    """Evaluates the pending requests of many bots in a single forward pass.
+
+    A background thread takes up to `max_batch_size` requests, waiting at most
+    `max_wait` seconds after the first one for the batch to fill up. On `stop`,
+    the batch being evaluated is finished and the requests still queued fail
+    with `InferenceStopped`, so that no bot waits for them forever.
+    """
+
+    def __init__(self, model: Model, max_batch_size: int = 64, max_wait: float = 0.001):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests: Queue[tuple[np.ndarray, np.ndarray, Future]] = Queue()
+        self.batches = 0
+        self.worker: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        # Held to start, stop and submit: no request is queued behind a stopped worker
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            self._start()
+
+    def _start(self):
+        if self.worker is None:
+            self.stopped.clear()
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+
+    def stop(self):
+        with self.lock:
+            self.stopped.set()
+            if self.worker is not None:
+                self.worker.join()
+                self.worker = None
+            while True:
+                try:
+                    _, _, future = self.requests.get_nowait()
+                except Empty:
+                    break
+                future.set_exception(InferenceStopped("The inference was stopped."))
+
+    def submit(self, obs: np.ndarray, mask: np.ndarray) -> Future:
+        future = Future()
+        with self.lock:
+            self._start()
+            self.requests.put((obs, mask, future))
+        return future
+
+    def next_batch(self) -> list[tuple[np.ndarray, np.ndarray, Future]]:
+        try:
+            batch = [self.requests.get(timeout=0.05)]
+        except Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                batch.append(self.requests.get(timeout=max(0.0, timeout)))
+            except Empty:
+                break
+        return batch
+
+    def run(self):
+        while not self.stopped.is_set():
+            batch = self.next_batch()
+            if not batch:
+                continue
+            observations = np.stack([obs for obs, _, _ in batch])
+            masks = np.stack([mask for _, mask, _ in batch])
+            try:
+                scores = self.model(observations, masks)
+            except Exception as err:
+                for _, _, future in batch:
+                    future.set_exception(err)
+                continue
+            self.batches += 1
+            for (_, _, future), row in zip(batch, scores):
+                future.set_result(row)
+
+
+class BatchedBot:
+    """A bot that picks the legal action with the best score from a shared model.
+
+    Many instances (usually on different threads) share one BatchedInference.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        inference: BatchedInference,
+        cap: Optional[int] = 20,
+        rng: Optional[random.Random] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.inference = inference
+        self.cap = cap
+        self.rng = rng
+        self.timeout = timeout  # Seconds to wait for the scores, then `concurrent.futures.TimeoutError`
+
+    def decide(self, game: Game) -> Action:
+        assert game.expected.name == self.name, "It's not my turn."
+        options = indexed_possibilities(game, cap=self.cap, rng=self.rng)
+        mask = legal_mask(options)
+        scores = self.inference.submit(observation(game), mask).result(self.timeout)
+        best = max(options, key=lambda index: scores[index])
+        return options[best]
@@ -0,0 +1,159 @@
+"""Opening book built from self-play.
+
+The first moves of a game are expensive to search, yet the same positions
+come back game after game. The book records how often every move was played
+from every opening position, and how often the player who played it went on
+to win. Positions are keyed by a 64-bit hash of their seat-rotation
+canonical form, where the order of the tiles doesn't count: the covered
+tiles are hidden, and the exposed ones only go back under them.
+
+The book is a `.npy` array of `ENTRY` records sorted by hash and action. It
+is memory-mapped read-only, and looked up by binary search.
+"""
+import os
+import random
+import sys
+import time
+from hashlib import blake2b
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from ..actions import Action, MayorAction
+from ..canonical import seats
+from ..encoding import POLICY_INDEX, policy_action, policy_key
+from ..game import Game
+from ..state import encode_state
+from .rufus import Rufus
+
+ENTRY = np.dtype([("hash", "<u8"), ("action", "<i4"), ("visits", "<u4"), ("wins", "<u4")])
+
+
+def position_hash(game: Game) -> int:
+    """Hash of what the acting player knows of the position, from their seat."""
+    state = encode_state(game, seats=seats(game), sort_tiles=True)
+    digest = blake2b(state.tobytes(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def build_book(
+    path: str,
+    games: int = 1000,
+    plies: int = 12,
+    usernames: Sequence[str] = ("Aaron", "Bard", "Carl", "Dave"),
+    min_visits: int = 2,
+    seed: int = 0,
+    make_bot: Callable[[str, random.Random], object] = Rufus,
+) -> int:
+    """Play `games` games and write the statistics of their first `plies` moves.
+
+    Mayor moves have no fixed policy index and are left out of the book.
+    Returns the number of entries.
+    """
+    rng = random.Random(seed)
+    stats: dict[tuple[int, int], list[int]] = {}
+    for _ in range(games):
+        game = Game.start(usernames, rng=rng)
+        bots = {name: make_bot(name, rng) for name in game.play_order}
+        played: list[tuple[int, int, str]] = []
+        while not game.is_terminal:
+            action = bots[game.expected.name].decide(game)  # type: ignore
+            if len(game.past_actions) < plies and not isinstance(action, MayorAction):
+                played.append((position_hash(game), POLICY_INDEX[policy_key(action)], action.name))
+            game.step(action)
+        winner = next(iter(game.result()))
+        for key, index, name in played:
+            entry = stats.setdefault((key, index), [0, 0])
+            entry[0] += 1
+            entry[1] += name == winner
+
+    entries = np.array(
+        [(key, index, visits, wins) for (key, index), (visits, wins) in stats.items() if visits >= min_visits],
+        dtype=ENTRY,
+    )
+    entries = entries[np.lexsort((entries["action"], entries["hash"]))]
+    # Write under another name first, so that readers never map a partial book
+    with open(f"{path}.tmp", "wb") as file:
+        np.save(file, entries)
+    os.replace(f"{path}.tmp", path)
+    return len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        self.entries = np.load(path, mmap_mode="r")
+        assert self.entries.dtype == ENTRY, f"{path} is not an opening book."
+        self.hashes = self.entries["hash"]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, game: Game) -> np.ndarray:
+        """Entries of the position, one per move that was played from it."""
+        key = np.uint64(position_hash(game))
+        start = int(np.searchsorted(self.hashes, key, side="left"))
+        end = int(np.searchsorted(self.hashes, key, side="right"))
+        return self.entries[start:end]
+
+    def best(self, game: Game, min_visits: int = 1) -> Optional[Action]:
+        """The most played move of the position, if it is in the book."""
+        entries = self.lookup(game)
+        entries = entries[entries["visits"] >= min_visits]
+        if len(entries) == 0:
+            return None
+        best = max(entries, key=lambda entry: (entry["visits"], entry["wins"]))
+        return policy_action(int(best["action"]), game.expected.name)
+
+
+class BookBot:
+    """Plays the book moves, and leaves the other decisions to another bot."""
+
+    def __init__(self, name: str, fallback, book: OpeningBook, min_visits: int = 1):
+        self.name = name
+        self.fallback = fallback
+        self.book = book
+        self.min_visits = min_visits
+
+    def decide(self, game: Game) -> Action:
+        assert game.expected.name == self.name, "It's not my turn."
+        return self.book.best(game, self.min_visits) or self.fallback.decide(game)
+
+
+def benchmark(games: int = 200, plies: int = 12, seed: int = 0) -> dict[str, float]:
+    """Microseconds per `position_hash` and per `OpeningBook.lookup`, on the positions of a fresh book."""
+    import tempfile
+
+    rng = random.Random(seed + 1)
+    positions = []
+    for _ in range(50):
+        game = Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=rng)
+        bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+        while len(game.past_actions) < plies:
+            positions.append(game.copy())
+            game.step(bots[game.expected.name].decide(game))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.npy")
+        entries = build_book(path, games=games, plies=plies, seed=seed)
+        book = OpeningBook(path)
+        for game in positions:  # Warm up
+            book.lookup(game)
+        start = time.perf_counter()
+        for game in positions:
+            position_hash(game)
+        hash_us = (time.perf_counter() - start) / len(positions) * 1e6
+        start = time.perf_counter()
+        for game in positions:
+            book.lookup(game)
+        lookup_us = (time.perf_counter() - start) / len(positions) * 1e6
+        del book
+    return {"entries": entries, "hash_us": hash_us, "lookup_us": lookup_us}
+
+
+if __name__ == "__main__":
+    # python -m <package>.bots.book [<path> [games] [plies]]: build a book, or benchmark without a path
+    if len(sys.argv) > 1:
+        path, *args = sys.argv[1:]
+        print(build_book(path, *map(int, args)), "entries")
+    else:
+        print(benchmark())
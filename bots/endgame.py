@@ -0,0 +1,276 @@
+"""Exact search of the last moves of a game.
+
+After setup the game has no chance, so once the end is near the remaining
+tree can be searched to the end. The solver runs iterative deepening until
+every line of play reaches game over (the position is solved) or the node
+budget runs out. Mayor moves are limited to dominant distributions.
+"""
+import random
+import time
+from typing import Optional, Union
+
+from attr import define
+
+from ..actions import Action, MayorAction
+from ..game import Game
+from ..state import encode_state
+from .heuristics import POLICIES
+
+
+class OutOfBudget(Exception):
+    pass
+
+
+@define
+class Bound:
+    """A paranoid entry: the margin of the root player, or a bound of it."""
+
+    value: float
+    depth: int
+    complete: bool  # Every line below reaches game over, value holds at any depth
+    flag: int  # EXACT, LOWER or UPPER bound
+    best: Optional[Action]
+
+
+@define
+class Values:
+    """A max^n entry: the values of all players."""
+
+    values: dict[str, int]
+    depth: int
+    complete: bool
+    best: Optional[Action]
+
+
+@define
+class Solution:
+    action: Action
+    value: Union[float, dict[str, int]]  # Margin of the root player (paranoid) or values of all players (maxn)
+    result: dict[str, tuple[int, ...]]  # Game.result() at the end of the best line
+
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def outcome(game: Game) -> dict[str, int]:
+    """Final value of every town, with the tie-break as the least significant part."""
+    return {name: 1000 * tally[0] + tally[-1] for name, tally in game.result().items()}
+
+
+class EndgameSolver:
+    """Iterative-deepening paranoid alpha-beta or max^n, with a transposition table.
+
+    In paranoid mode the root player maximizes its margin over the best of
+    the others, who all play against it. In max^n mode every player
+    maximizes its own final value. Moves are ordered with the heuristic
+    policies, which draw from the solver's own `rng`.
+    """
+
+    def __init__(
+        self,
+        max_nodes: int = 100_000,
+        max_depth: int = 80,
+        mode: str = "paranoid",
+        rng: Optional[random.Random] = None,
+    ):
+        assert mode in ("paranoid", "maxn"), f"Unknown mode {mode}."
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.mode = mode
+        self.rng = rng or random.Random(0)
+        self.nodes = 0
+        self.seconds = 0.0
+        self.attempts = 0
+        self.solved = 0
+        self.bounds: dict[bytes, Bound] = {}
+        self.values: dict[bytes, Values] = {}
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "nodes": self.nodes,
+            "nodes_per_second": self.nodes / self.seconds if self.seconds else 0.0,
+            "solved_rate": self.solved / self.attempts if self.attempts else 0.0,
+        }
+
+    @staticmethod
+    def is_endgame(game: Game, points: int = 10, people: int = 5, space: int = 2) -> bool:
+        """Whether the end is near enough to try solving the position."""
+        board = game.board
+        return (
+            board.endgame_reason is not None
+            or board.points <= points
+            or board.people <= people
+            or board.min_free_build_space <= space
+        )
+
+    def moves(self, game: Game, best: Optional[Action]) -> list[Action]:
+        expected = game.expected
+        if isinstance(expected, MayorAction):
+            moves = list(expected.possibilities(game.board, prune=True))
+        else:
+            moves = list(expected.possibilities(game.board))
+        # Try the best move of a previous iteration first, then the heuristic one
+        hint = POLICIES[expected.type](game.board, expected, self.rng)
+        for first in (hint, best):
+            if first is not None and first in moves:
+                moves.remove(first)
+                moves.insert(0, first)
+        return moves
+
+    def child(self, game: Game, action: Action) -> Game:
+        self.nodes += 1
+        if self.nodes > self.budget:
+            raise OutOfBudget
+        child = game.copy()
+        child.take_action(action, trusted=True)
+        return child
+
+    def paranoid(self, game: Game, root: str, depth: int, alpha: float, beta: float) -> tuple[float, bool]:
+        if game.is_terminal:
+            values = outcome(game)
+            return values[root] - max(v for name, v in values.items() if name != root), True
+        if depth == 0:
+            values = {town.name: 1000 * town.tally_details()[0] for town in game.board.towns.values()}
+            return values[root] - max(v for name, v in values.items() if name != root), False
+
+        key = encode_state(game).tobytes()
+        entry = self.bounds.get(key)
+        if entry is not None and (entry.complete or entry.depth >= depth):
+            if entry.flag == EXACT:
+                return entry.value, entry.complete
+            if entry.flag == LOWER and entry.value >= beta:
+                return entry.value, entry.complete
+            if entry.flag == UPPER and entry.value <= alpha:
+                return entry.value, entry.complete
+
+        maximizing = game.expected.name == root
+        start_alpha, start_beta = alpha, beta
+        best_value: Optional[float] = None
+        best_move, complete = None, True
+        for move in self.moves(game, entry.best if entry else None):
+            value, move_complete = self.paranoid(self.child(game, move), root, depth - 1, alpha, beta)
+            complete = complete and move_complete
+            if best_value is None or (value > best_value if maximizing else value < best_value):
+                best_value, best_move = value, move
+            if maximizing:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        assert best_value is not None
+        if best_value <= start_alpha:
+            flag = UPPER
+        elif best_value >= start_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.bounds[key] = Bound(best_value, depth, complete, flag, best_move)
+        return best_value, complete
+
+    def maxn(self, game: Game, depth: int) -> tuple[dict[str, int], bool]:
+        if game.is_terminal:
+            return outcome(game), True
+        if depth == 0:
+            return {town.name: 1000 * town.tally_details()[0] for town in game.board.towns.values()}, False
+
+        key = encode_state(game).tobytes()
+        entry = self.values.get(key)
+        if entry is not None and (entry.complete or entry.depth >= depth):
+            return entry.values, entry.complete
+
+        player = game.expected.name
+        best_values: Optional[dict[str, int]] = None
+        best_move, complete = None, True
+        for move in self.moves(game, entry.best if entry else None):
+            values, move_complete = self.maxn(self.child(game, move), depth - 1)
+            complete = complete and move_complete
+            if best_values is None or values[player] > best_values[player]:
+                best_values, best_move = values, move
+
+        assert best_values is not None
+        self.values[key] = Values(best_values, depth, complete, best_move)
+        return best_values, complete
+
+    def best_move(self, game: Game, root: str) -> Action:
+        """The best move of a solved position.
+
+        Only exact entries hold a best move: the best move of a bound may just
+        refute a line. Positions without one are searched again with a full
+        window, which stores an exact entry.
+        """
+        key = encode_state(game).tobytes()
+        if self.mode == "paranoid":
+            bound = self.bounds.get(key)
+            if bound is None or bound.flag != EXACT or not bound.complete or bound.best is None:
+                self.bounds.pop(key, None)
+                self.paranoid(game, root, self.max_depth, float("-inf"), float("inf"))
+                bound = self.bounds[key]
+            best = bound.best
+        else:
+            values = self.values.get(key)
+            if values is None or not values.complete or values.best is None:
+                self.values.pop(key, None)
+                self.maxn(game, self.max_depth)
+                values = self.values[key]
+            best = values.best
+        assert best is not None
+        return best
+
+    def solve(self, game: Game) -> Optional[Solution]:
+        """The best move and the final result, if the position can be solved."""
+        self.attempts += 1
+        start = time.perf_counter()
+        self.budget = self.nodes + self.max_nodes
+        self.bounds, self.values = {}, {}
+        root = Game(
+            play_order=game.play_order,
+            actions=game.actions,
+            past_actions=[],
+            board=game.board,
+            pseudos=game.pseudos,
+        ).copy()
+        name = game.expected.name
+        value: Union[float, dict[str, int]]
+        try:
+            for depth in range(1, self.max_depth + 1):
+                if self.mode == "paranoid":
+                    value, complete = self.paranoid(root, name, depth, float("-inf"), float("inf"))
+                else:
+                    value, complete = self.maxn(root, depth)
+                if complete:
+                    break
+            else:
+                return None
+        except OutOfBudget:
+            self.seconds += time.perf_counter() - start
+            return None
+
+        # The value is known: follow the best line to game over, whatever it costs
+        self.budget = float("inf")
+        action = self.best_move(root, name)
+        line = root.copy()
+        line.take_action(action, trusted=True)
+        while not line.is_terminal:
+            line.take_action(self.best_move(line, name), trusted=True)
+        self.seconds += time.perf_counter() - start
+        self.solved += 1
+        return Solution(action=action, value=value, result=line.result())
+
+
+class EndgameBot:
+    """Solves the endgame exactly, and leaves the other decisions to another bot."""
+
+    def __init__(self, name: str, fallback, solver: Optional[EndgameSolver] = None):
+        self.name = name
+        self.fallback = fallback
+        self.solver = solver or EndgameSolver()
+
+    def decide(self, game: Game) -> Action:
+        assert game.expected.name == self.name, "It's not my turn."
+        if self.solver.is_endgame(game):
+            solution = self.solver.solve(game)
+            if solution is not None:
+                return solution.action
+        return self.fallback.decide(game)
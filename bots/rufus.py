@@ -1,4 +1,6 @@
-from random import choice
+import random
+from typing import Optional
+
 from ..game import Game
 
 from .. import Action
@@ -6,9 +8,10 @@ from .. import Action
 
 class Rufus:
     """A bot that take decisions randomly."""
-    def __init__(self, name: str):
+    def __init__(self, name: str, rng: Optional[random.Random] = None):
         self.name = name
+        self.rng = rng or random
 
     def decide(self, game: Game) -> Action:
         assert game.expected.name == self.name, "It's not my turn."
-        return choice(game.expected.possibilities(game.board, cap=20))
\ No newline at end of file
+        return self.rng.choice(game.expected.possibilities(game.board, cap=20, rng=self.rng))
@@ -0,0 +1,63 @@
+"""Seat-rotation canonical form of positions.
+
+Positions that only differ by the seat of the players are the same position
+for search and learning. The canonical form rotates the towns so that the
+acting player comes first, and renames the players after their seat ("P0" is
+the acting player, "P1" the next one...). Actions are converted between the
+original and the canonical names with `to_canonical` and `to_original`.
+"""
+from copy import deepcopy
+from hashlib import blake2b
+
+from attr import evolve
+
+from .actions import Action
+from .game import Game
+from .state import SEAT_NAMES, encode_state
+
+
+def acting_player(game: Game) -> str:
+    return game.expected.name if game.actions else game.play_order[0]
+
+
+def seats(game: Game) -> list[str]:
+    """Original names of the players, by canonical seat."""
+    return list(game.board.round_from(acting_player(game)))
+
+
+def to_canonical(action: Action, seats: list[str]) -> Action:
+    return evolve(action, name=SEAT_NAMES[seats.index(action.name)])
+
+
+def to_original(action: Action, seats: list[str]) -> Action:
+    return evolve(action, name=seats[SEAT_NAMES.index(action.name)])
+
+
+def canonical_game(game: Game) -> Game:
+    """The canonical position of the game, without its history."""
+    order = seats(game)
+    names = dict(zip(order, SEAT_NAMES))
+    board = deepcopy(game.board)
+    towns = board.towns
+    board.towns = {}
+    for name in order:
+        town = towns[name]
+        town.name = names[name]
+        board.towns[town.name] = town
+    return Game(
+        play_order=list(SEAT_NAMES[: len(order)]),
+        actions=[to_canonical(action, order) for action in game.actions],
+        past_actions=[],
+        board=board,
+        pseudos={username: names[pseudo] for username, pseudo in game.pseudos.items()},
+    )
+
+
+def canonical_key(game: Game) -> bytes:
+    return encode_state(game, seats=seats(game)).tobytes()
+
+
+def canonical_hash(game: Game) -> int:
+    """A 64-bit hash of the canonical position, stable across processes."""
+    digest = blake2b(canonical_key(game), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
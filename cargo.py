@@ -0,0 +1,169 @@
+"""Where the goods of the towns go: the trading house and the cargo ships.
+
+The market only keeps how many of every good it holds, and the fleet keeps
+its ships as parallel lists of sizes, goods (by index in `GOODS`, -1 for
+none) and amounts, updated in place by the trader and captain phases.
+Both still read like the list and the dict of `ShipData` they replace, and
+unstructure to them.
+"""
+from collections.abc import Collection, Mapping
+from typing import Iterable, Iterator, Optional
+
+from .constants import GOOD_INDEX, GOODS, Good
+from .utils import ShipData
+
+MARKET_SPACE = 4
+
+
+class Market(Collection):
+    """The goods sold in the trading house, in the order of `GOODS`."""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, goods: Iterable[Good] = ()):
+        self.counts = [0] * len(GOODS)
+        self.total = 0
+        for good in goods:
+            self.append(good)
+
+    def append(self, good: Good):
+        self.counts[GOOD_INDEX[good]] += 1
+        self.total += 1
+
+    def count(self, good: Good) -> int:
+        return self.counts[GOOD_INDEX[good]]
+
+    def is_full(self) -> bool:
+        return self.total >= MARKET_SPACE
+
+    def clear(self):
+        self.counts = [0] * len(GOODS)
+        self.total = 0
+
+    def copy(self) -> "Market":
+        market = Market.__new__(Market)
+        market.counts = self.counts[:]
+        market.total = self.total
+        return market
+
+    def __deepcopy__(self, memo: dict) -> "Market":
+        copied = memo[id(self)] = self.copy()
+        return copied
+
+    def __reduce__(self):
+        return Market, (list(self),)
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __contains__(self, good) -> bool:
+        return good in GOOD_INDEX and self.counts[GOOD_INDEX[good]] > 0
+
+    def __iter__(self) -> Iterator[Good]:
+        for good, count in zip(GOODS, self.counts):
+            for _ in range(count):
+                yield good
+
+    def __eq__(self, other) -> bool:
+        # The order in which goods were sold doesn't matter
+        if isinstance(other, (list, tuple)):
+            other = Market(other)
+        if not isinstance(other, Market):
+            return NotImplemented
+        return self.counts == other.counts
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"Market({list(self)!r})"
+
+
+def to_market(goods: Iterable[Good]) -> Market:
+    return goods if isinstance(goods, Market) else Market(goods)
+
+
+class Fleet(Mapping):
+    """The cargo ships, by size."""
+
+    __slots__ = ("sizes", "goods", "amounts")
+
+    def __init__(self, ships: Mapping[int, ShipData]):
+        self.sizes = list(ships)
+        self.goods = [-1 if ship.type is None else GOOD_INDEX[ship.type] for ship in ships.values()]
+        self.amounts = [ship.amount for ship in ships.values()]
+
+    def good(self, size: int) -> Optional[Good]:
+        code = self.goods[self.sizes.index(size)]
+        return None if code < 0 else GOODS[code]
+
+    def amount(self, size: int) -> int:
+        return self.amounts[self.sizes.index(size)]
+
+    def accepts(self, size: int, good: Good) -> bool:
+        """Ships only take a good that no other ship carries, up to their size."""
+        code = GOOD_INDEX[good]
+        index = self.sizes.index(size)
+        for other, other_code in enumerate(self.goods):
+            if other != index and other_code == code:
+                return False
+        amount = self.amounts[index]
+        return amount == 0 or (self.goods[index] == code and amount < size)
+
+    def load(self, size: int, good: Good, amount: int):
+        index = self.sizes.index(size)
+        self.goods[index] = GOOD_INDEX[good]
+        self.amounts[index] += amount
+
+    def unload_full(self) -> list[tuple[Good, int]]:
+        """Empty the full ships, and return what they carried."""
+        unloaded = []
+        for index, size in enumerate(self.sizes):
+            code, amount = self.goods[index], self.amounts[index]
+            if code >= 0 and amount >= size:
+                unloaded.append((GOODS[code], amount))
+                self.goods[index] = -1
+                self.amounts[index] = 0
+        return unloaded
+
+    def copy(self) -> "Fleet":
+        fleet = Fleet.__new__(Fleet)
+        fleet.sizes = self.sizes[:]
+        fleet.goods = self.goods[:]
+        fleet.amounts = self.amounts[:]
+        return fleet
+
+    def __deepcopy__(self, memo: dict) -> "Fleet":
+        copied = memo[id(self)] = self.copy()
+        return copied
+
+    def __reduce__(self):
+        return Fleet, (dict(self.items()),)
+
+    def __getitem__(self, size: int) -> ShipData:
+        """A snapshot of the ship: change the fleet with `load` and `unload_full`."""
+        if size not in self.sizes:
+            raise KeyError(size)
+        index = self.sizes.index(size)
+        code = self.goods[index]
+        return ShipData(size, None if code < 0 else GOODS[code], self.amounts[index])
+
+    def __setitem__(self, size: int, ship: ShipData):
+        index = self.sizes.index(size)
+        self.goods[index] = -1 if ship.type is None else GOOD_INDEX[ship.type]
+        self.amounts[index] = ship.amount
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.sizes)
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def __contains__(self, size) -> bool:
+        return size in self.sizes
+
+    def __repr__(self) -> str:
+        return f"Fleet({dict(self.items())!r})"
+
+
+def to_fleet(ships: Mapping[int, ShipData]) -> Fleet:
+    return ships if isinstance(ships, Fleet) else Fleet(ships)
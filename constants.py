@@ -1,4 +1,5 @@
-from typing import Literal, Union, get_args
+from types import MappingProxyType
+from typing import Literal, Mapping, Union, get_args
 
 ActionType = Literal[
     "builder",
@@ -154,36 +155,59 @@ COUNTABLES = GOODS + ("money", "people", "points")
 NONPROD_BUILDINGS: tuple[Building, ...] = SMALL_BUILDINGS + LARGE_BUILDINGS
 BUILDINGS: tuple[Building, ...] = PROD_BUILDINGS + NONPROD_BUILDINGS
 
-BUILD_INFO: dict[Building, dict[str, int]] = {
-    "city_hall": {"tier": 4, "cost": 10, "space": 1, "initial": 1},
-    "coffee_roaster": {"tier": 3, "cost": 6, "space": 2, "initial": 3},
-    "construction_hut": {"tier": 1, "cost": 2, "space": 1, "initial": 2},
-    "custom_house": {"tier": 4, "cost": 10, "space": 1, "initial": 1},
-    "factory": {"tier": 3, "cost": 7, "space": 1, "initial": 2},
-    "fortress": {"tier": 4, "cost": 10, "space": 1, "initial": 1},
-    "guild_hall": {"tier": 4, "cost": 10, "space": 1, "initial": 1},
-    "hacienda": {"tier": 1, "cost": 2, "space": 1, "initial": 2},
-    "harbor": {"tier": 3, "cost": 8, "space": 1, "initial": 2},
-    "hospice": {"tier": 2, "cost": 4, "space": 1, "initial": 2},
-    "indigo_plant": {"tier": 2, "cost": 3, "space": 3, "initial": 3},
-    "large_market": {"tier": 2, "cost": 5, "space": 1, "initial": 2},
-    "large_warehouse": {"tier": 2, "cost": 6, "space": 1, "initial": 2},
-    "office": {"tier": 2, "cost": 5, "space": 1, "initial": 2},
-    "residence": {"tier": 4, "cost": 10, "space": 1, "initial": 1},
-    "small_indigo_plant": {"tier": 1, "cost": 1, "space": 1, "initial": 4},
-    "small_market": {"tier": 1, "cost": 1, "space": 1, "initial": 2},
-    "small_sugar_mill": {"tier": 1, "cost": 2, "space": 1, "initial": 4},
-    "small_warehouse": {"tier": 1, "cost": 3, "space": 1, "initial": 2},
-    "sugar_mill": {"tier": 2, "cost": 4, "space": 3, "initial": 3},
-    "tobacco_storage": {"tier": 3, "cost": 5, "space": 3, "initial": 3},
-    "university": {"tier": 3, "cost": 8, "space": 1, "initial": 2},
-    "wharf": {"tier": 3, "cost": 9, "space": 1, "initial": 2},
-}
+# Tables below are read-only views, shared by the games of every thread
+BUILD_INFO: Mapping[Building, Mapping[str, int]] = MappingProxyType({
+    "city_hall": MappingProxyType({"tier": 4, "cost": 10, "space": 1, "initial": 1}),
+    "coffee_roaster": MappingProxyType({"tier": 3, "cost": 6, "space": 2, "initial": 3}),
+    "construction_hut": MappingProxyType({"tier": 1, "cost": 2, "space": 1, "initial": 2}),
+    "custom_house": MappingProxyType({"tier": 4, "cost": 10, "space": 1, "initial": 1}),
+    "factory": MappingProxyType({"tier": 3, "cost": 7, "space": 1, "initial": 2}),
+    "fortress": MappingProxyType({"tier": 4, "cost": 10, "space": 1, "initial": 1}),
+    "guild_hall": MappingProxyType({"tier": 4, "cost": 10, "space": 1, "initial": 1}),
+    "hacienda": MappingProxyType({"tier": 1, "cost": 2, "space": 1, "initial": 2}),
+    "harbor": MappingProxyType({"tier": 3, "cost": 8, "space": 1, "initial": 2}),
+    "hospice": MappingProxyType({"tier": 2, "cost": 4, "space": 1, "initial": 2}),
+    "indigo_plant": MappingProxyType({"tier": 2, "cost": 3, "space": 3, "initial": 3}),
+    "large_market": MappingProxyType({"tier": 2, "cost": 5, "space": 1, "initial": 2}),
+    "large_warehouse": MappingProxyType({"tier": 2, "cost": 6, "space": 1, "initial": 2}),
+    "office": MappingProxyType({"tier": 2, "cost": 5, "space": 1, "initial": 2}),
+    "residence": MappingProxyType({"tier": 4, "cost": 10, "space": 1, "initial": 1}),
+    "small_indigo_plant": MappingProxyType({"tier": 1, "cost": 1, "space": 1, "initial": 4}),
+    "small_market": MappingProxyType({"tier": 1, "cost": 1, "space": 1, "initial": 2}),
+    "small_sugar_mill": MappingProxyType({"tier": 1, "cost": 2, "space": 1, "initial": 4}),
+    "small_warehouse": MappingProxyType({"tier": 1, "cost": 3, "space": 1, "initial": 2}),
+    "sugar_mill": MappingProxyType({"tier": 2, "cost": 4, "space": 3, "initial": 3}),
+    "tobacco_storage": MappingProxyType({"tier": 3, "cost": 5, "space": 3, "initial": 3}),
+    "university": MappingProxyType({"tier": 3, "cost": 8, "space": 1, "initial": 2}),
+    "wharf": MappingProxyType({"tier": 3, "cost": 9, "space": 1, "initial": 2}),
+})
 
-TILE_INFO: dict[Tile, int] = {
+GOOD_INDEX: Mapping[Good, int] = MappingProxyType({good: i for i, good in enumerate(GOODS)})
+
+GOOD_PRICES: Mapping[Good, int] = MappingProxyType({
+    "coffee": 4,
+    "corn": 0,
+    "indigo": 1,
+    "sugar": 2,
+    "tobacco": 3,
+})
+
+PRODUCTION_BUILDINGS: Mapping[Good, tuple[ProdBuilding, ...]] = MappingProxyType({
+    "coffee": ("coffee_roaster",),
+    "corn": (),
+    "indigo": ("small_indigo_plant", "indigo_plant"),
+    "sugar": ("small_sugar_mill", "sugar_mill"),
+    "tobacco": ("tobacco_storage",),
+})
+
+GOOD_TILES: Mapping[Good, Tile] = MappingProxyType({
+    good: f"{good}_tile" for good in GOODS  # type: ignore
+})
+
+TILE_INFO: Mapping[Tile, int] = MappingProxyType({
     "coffee_tile": 8,
     "corn_tile": 10,
     "indigo_tile": 12,
     "sugar_tile": 11,
     "tobacco_tile": 9,
-}
+})
@@ -0,0 +1,127 @@
+"""Running counters of a board, for the refill and endgame checks.
+
+A board's `Counters` is attached to its towns and to their buildings, and
+is kept up to date by the changes it is told about:
+
+- `Workplaces.__setitem__` of the buildings gives the old and the new entry,
+  so that a built or staffed building costs O(1);
+- the `counted` hook of the town fields `role` and `buildings` counts the
+  towns with a role, and swaps a replaced buildings dict;
+- other changes of the buildings (removals, `update`, ...) recount that dict.
+
+So the checks cost O(1) per move, and towns changed directly (tests, tools)
+keep them right as well. Copies of a board get a copy of its counters;
+unpickled boards and boards with new towns recount on first use.
+"""
+from typing import Any, Iterable, Optional
+
+from .constants import BUILD_INFO, LARGE_BUILDINGS, Building
+from .utils import WorkplaceData, Workplaces
+
+
+def building_jobs(building: Building, data: Optional[WorkplaceData]) -> tuple[int, int]:
+    """The vacant jobs and the build space of a building entry."""
+    if data is None or data.placed == 0:
+        return 0, 0
+    return max(0, BUILD_INFO[building]["space"] - data.worked), 2 if building in LARGE_BUILDINGS else 1
+
+
+class Counters:
+    __slots__ = ("vacant_building_jobs", "towns_with_role", "min_free_build_space", "free_spaces")
+
+    def __init__(self, towns: Iterable[Any] = ()):
+        self.vacant_building_jobs = 0
+        self.towns_with_role = 0
+        self.min_free_build_space = 12
+        # How many towns have every amount of free space: the counters don't
+        # refer to the buildings, so copies free themselves without the GC.
+        self.free_spaces: dict[int, int] = {}
+        for town in towns:
+            object.__setattr__(town, "counters", self)
+            self.towns_with_role += town.role is not None
+            self.attach(town.buildings)
+
+    def attach(self, buildings: Workplaces):
+        buildings.counters = self
+        buildings.vacant_jobs, buildings.free_space = 0, 12
+        self.free_spaces[12] = self.free_spaces.get(12, 0) + 1
+        self.recount(buildings)
+
+    def detach(self, buildings: Workplaces):
+        buildings.counters = None
+        self.vacant_building_jobs -= buildings.vacant_jobs
+        self.move_space(buildings.free_space, None)
+
+    def replace(self, old: Workplaces, new: Workplaces):
+        """The buildings of a town are replaced by a new dict."""
+        if old.counters is self:
+            self.detach(old)
+        self.attach(new)
+
+    def changed(self, buildings: Workplaces, building: Building, old: Optional[WorkplaceData], new: WorkplaceData):
+        """A building entry is replaced: count the difference."""
+        old_jobs, old_space = building_jobs(building, old)
+        new_jobs, new_space = building_jobs(building, new)
+        if new_jobs != old_jobs:
+            buildings.vacant_jobs += new_jobs - old_jobs
+            self.vacant_building_jobs += new_jobs - old_jobs
+        if new_space != old_space:
+            free = buildings.free_space + old_space - new_space
+            self.move_space(buildings.free_space, free)
+            buildings.free_space = free
+
+    def recount(self, buildings: Workplaces):
+        """Count a buildings dict again, after a change of many entries."""
+        vacant, free = 0, 12
+        for building, data in buildings.items():
+            jobs, space = building_jobs(building, data)
+            vacant += jobs
+            free -= space
+        self.vacant_building_jobs += vacant - buildings.vacant_jobs
+        self.move_space(buildings.free_space, free)
+        buildings.vacant_jobs, buildings.free_space = vacant, free
+
+    def move_space(self, old: int, new: Optional[int]):
+        """A town goes from `old` free space to `new` (None when it leaves)."""
+        free_spaces = self.free_spaces
+        free_spaces[old] -= 1
+        if not free_spaces[old]:
+            del free_spaces[old]
+        if new is not None:
+            free_spaces[new] = free_spaces.get(new, 0) + 1
+        if new is not None and new < self.min_free_build_space:
+            self.min_free_build_space = new
+        elif old == self.min_free_build_space and old not in free_spaces:
+            # Not in games: only a town that lost a building, or that left
+            self.min_free_build_space = min(free_spaces, default=12)
+
+    def copy(self, towns: Iterable[tuple[Any, Any]]) -> "Counters":
+        """The same counters, attached to the copies of the towns, by (town, copy) pairs."""
+        counters = Counters.__new__(Counters)
+        counters.vacant_building_jobs = self.vacant_building_jobs
+        counters.towns_with_role = self.towns_with_role
+        counters.min_free_build_space = self.min_free_build_space
+        counters.free_spaces = self.free_spaces.copy()
+        setattr = object.__setattr__
+        for town, copied in towns:
+            setattr(copied, "counters", counters)
+            original = town.buildings
+            copied.buildings.__dict__.update(
+                counters=counters, vacant_jobs=original.vacant_jobs, free_space=original.free_space
+            )
+        return counters
+
+    def __reduce__(self):
+        # Counted again by the board on first use
+        return type(None), ()
+
+
+def counted(town: Any, attribute: Any, value: Any) -> Any:
+    """`on_setattr` hook of the town fields that the counters follow."""
+    counters = town.counters
+    if counters is not None:
+        if attribute.name == "role":
+            counters.towns_with_role += (value is not None) - (town.role is not None)
+        else:
+            counters.replace(town.buildings, value)
+    return value
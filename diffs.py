@@ -0,0 +1,172 @@
+"""Per-move diffs of games, for spectators and remote clients.
+
+A diff holds what a move changed, instead of the whole game:
+
+- "board": the changed fields of the unstructured board, nested (a town's
+  money is at `{"towns": {"Aa": {"money": 3}}}`, a role at
+  `{"roles": {"mayor": ...}}`, None if removed). Other values are sent whole.
+- "queue": the number of prompts dropped from the front of the queue, and
+  the prompts inserted in it, by index in the new queue.
+- "action": the action that was taken.
+
+Keys are strings, so that diffs survive a JSON round trip. `DiffStream`
+builds a diff from the `journal.Journal` of the move and from the lengths of
+the queue buckets, and `apply_diff` patches the client objects in place: both
+cost O(change), not O(board).
+"""
+from itertools import islice
+from typing import Any, Optional, get_args, get_origin
+
+from attr import fields, fields_dict
+
+from .actions import Action
+from .boards import Board
+from .game import Game, converters
+from .journal import Journal
+from .utils import Workplaces
+
+# What the check mode compares besides the unstructured game
+COUNTERS = ("vacant_building_jobs", "towns_with_role", "min_free_build_space")
+
+
+def resolve(board: Board, path: tuple[str, ...]) -> Any:
+    target: Any = board
+    for part in path:
+        target = target[part] if isinstance(target, dict) else getattr(target, part)
+    return target
+
+
+def patch(target: Any, changes: dict[str, Any]):
+    """Set the changed fields of a board or a town, entry by entry in their dicts."""
+    converter = converters().game_converter
+    types = fields_dict(type(target))
+    for key, value in changes.items():
+        kind = types[key].type
+        if get_origin(kind) is not dict or not isinstance(value, dict):
+            setattr(target, key, converter.structure(value, kind))
+        elif key == "towns":
+            for name, town_changes in value.items():
+                patch(target.towns[name], town_changes)
+        else:
+            entries, entry_kind = getattr(target, key), get_args(kind)[1]
+            for entry, entry_value in value.items():
+                if entry_value is None:  # Removed
+                    entries.pop(entry, None)
+                else:
+                    entries[entry] = converter.structure(entry_value, entry_kind)
+
+
+def apply_diff(game: Game, diff: dict[str, Any]) -> Game:
+    """Bring a client copy of the game to the position after the move, in place."""
+    converter = converters().game_converter
+    with game.lock:
+        patch(game.board, diff["board"])
+        for _ in range(diff["queue"]["drop"]):
+            game.actions.popleft()
+        # Inserted prompts come by decreasing priority, after those already queued
+        game.actions.merge(
+            converter.structure(prompt, Action) for _, prompt in diff["queue"]["insert"]
+        )
+        game.past_actions.append(converter.structure(diff["action"], Action))
+    return game
+
+
+class DiffStream:
+    """Takes the moves of a game and returns their diffs.
+
+    The stream keeps a journal attached to the board of the game until
+    `close`. With `check`, every diff is applied to a copy of the previous
+    position and the result compared to the game (for tests and debugging).
+    """
+
+    def __init__(self, game: Game, check: bool = False):
+        self.game = game
+        self.check = check
+        self.journal = Journal()
+
+    def attach(self, board: Board, journal: Optional[Journal]):
+        """Note the changes of the board in the journal (stop with None)."""
+        board.journal = journal
+        for town in board.towns.values():
+            town.journal = journal
+            for name in ("tiles", "buildings"):
+                workplaces = getattr(town, name)
+                if isinstance(workplaces, Workplaces):
+                    workplaces.journal = journal
+                    workplaces.path = ("towns", town.name, name)
+
+    def close(self):
+        self.attach(self.game.board, None)
+
+    def step(self, action: Action) -> Optional[dict[str, Any]]:
+        """Take the action as `Game.step` does, and return its diff (None after game over)."""
+        game = self.game
+        with game.lock:
+            if game.is_terminal:
+                return None
+            previous = game.copy() if self.check else None
+            board = game.board
+            self.attach(board, self.journal)
+            self.journal.clear()
+            market, fleet = board.market.counts[:], board.goods_fleet.copy()
+            buckets = [len(bucket) for bucket in game.actions.buckets]
+            for priority in reversed(range(len(buckets))):
+                if buckets[priority]:
+                    buckets[priority] -= 1  # The expected action, dropped by the move
+                    break
+
+            game.take_action(action)
+
+            if game.board is not board:  # Replaced by the move: send it whole
+                self.attach(game.board, self.journal)
+                changes = {(): {field.name for field in fields(Board) if field.init}}
+            else:
+                if board.market.counts != market:
+                    self.journal.note((), "market")
+                if (board.goods_fleet.goods, board.goods_fleet.amounts) != (fleet.goods, fleet.amounts):
+                    self.journal.note((), "goods_fleet")
+                changes = self.journal.changes
+            diff = {
+                "board": self.board_diff(changes),
+                "queue": self.queue_diff(buckets),
+                "action": converters().game_converter.unstructure(action, Action),
+            }
+            if previous is not None:
+                self.compare(apply_diff(previous, diff), diff)
+            return diff
+
+    def board_diff(self, changes: dict[tuple[str, ...], set]) -> dict[str, Any]:
+        converter = converters().game_converter
+        board, diff = self.game.board, {}
+        for path, keys in changes.items():
+            target, nested = resolve(board, path), diff
+            for part in path:
+                nested = nested.setdefault(str(part), {})
+            for key in keys:
+                value = target.get(key) if isinstance(target, dict) else getattr(target, key)
+                nested[str(key)] = converter.unstructure(value)
+        return diff
+
+    def queue_diff(self, kept: list[int]) -> dict[str, Any]:
+        """The prompts queued by the move: the tails of the buckets past what was kept."""
+        converter = converters().game_converter
+        inserted, index = [], 0
+        for bucket, length in zip(reversed(self.game.actions.buckets), reversed(kept)):
+            new = len(bucket) - length
+            if new:
+                tail = reversed(list(islice(reversed(bucket), new)))
+                for offset, prompt in enumerate(tail):
+                    inserted.append([index + length + offset, converter.unstructure(prompt, Action)])
+            index += len(bucket)
+        return {"drop": 1, "insert": inserted}
+
+    def compare(self, applied: Game, diff: dict[str, Any]):
+        converter = converters().game_converter
+        game = self.game
+        assert converter.unstructure(applied) == converter.unstructure(game), (
+            f"Diff {diff} doesn't lead to the game."
+        )
+        for counter in COUNTERS:
+            assert getattr(applied.board, counter) == getattr(game.board, counter), (
+                f"Diff {diff} doesn't lead to the {counter} of the game."
+            )
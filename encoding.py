@@ -0,0 +1,140 @@
+"""Fixed-width numeric encoding of positions and actions, for learning bots.
+
+Observations are `Game.astuple` relative to a player, padded with zeros to
+the width of a five-player game. Actions are mapped to policy indices in
+`range(NUM_ACTIONS)`; mayor distributions have no fixed index and take the
+slots of the mayor block in the order of their sorted distributions.
+"""
+import random
+from functools import lru_cache
+from itertools import product
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+import numpy as np
+
+from .actions import *
+from .boards import Board
+from .constants import *
+from .game import Game
+from .towns import Town
+
+SHIP_SIZES = (4, 5, 6, 7, 8, 11)  # Cargo ships of every game size, and the wharf
+STORED_GOODS = (None, *GOODS)
+MAYOR_SLOTS = 64
+
+_index: dict[tuple, int] = {}
+for _key in [
+    ("governor",),
+    ("tidyup",),
+    *(("role", role) for role in ROLES),
+    ("settler", None, False, False),
+    *(("settler", *rest) for rest in product(TILES, (False, True), (False, True))),
+    ("builder", None, False),
+    *(("builder", *rest) for rest in product(BUILDINGS, (False, True))),
+    ("captain", None, None),
+    *(("captain", *rest) for rest in product(SHIP_SIZES, GOODS)),
+    ("craftsman", None),
+    *(("craftsman", good) for good in GOODS),
+    ("trader", None),
+    *(("trader", good) for good in GOODS),
+    *(("storage", *rest) for rest in product(STORED_GOODS, repeat=4)),
+]:
+    _index[_key] = len(_index)
+POLICY_INDEX: Mapping[tuple, int] = MappingProxyType(_index)
+MAYOR_OFFSET = len(POLICY_INDEX)
+NUM_ACTIONS = MAYOR_OFFSET + MAYOR_SLOTS
+POLICY_KEYS = tuple(POLICY_INDEX)
+
+# Fields of every action type, in the order of `policy_key`
+POLICY_FIELDS: Mapping[str, tuple[str, ...]] = MappingProxyType({
+    "builder": ("building_type", "extra_person"),
+    "captain": ("selected_ship", "selected_good"),
+    "craftsman": ("selected_good",),
+    "governor": (),
+    "role": ("role",),
+    "settler": ("tile", "down_tile", "extra_person"),
+    "storage": (
+        "selected_good",
+        "small_warehouse_good",
+        "large_warehouse_first_good",
+        "large_warehouse_second_good",
+    ),
+    "tidyup": (),
+    "trader": ("selected_good",),
+})
+
+
+def policy_key(action: Action) -> tuple:
+    """The hashable content of an action, without its player."""
+    if isinstance(action, RoleAction):
+        return ("role", action.role)
+    elif isinstance(action, SettlerAction):
+        return ("settler", action.tile, action.down_tile, action.extra_person)
+    elif isinstance(action, BuilderAction):
+        return ("builder", action.building_type, action.extra_person)
+    elif isinstance(action, CaptainAction):
+        return ("captain", action.selected_ship, action.selected_good)
+    elif isinstance(action, CraftsmanAction):
+        return ("craftsman", action.selected_good)
+    elif isinstance(action, TraderAction):
+        return ("trader", action.selected_good)
+    elif isinstance(action, StorageAction):
+        return (
+            "storage",
+            action.selected_good,
+            action.small_warehouse_good,
+            action.large_warehouse_first_good,
+            action.large_warehouse_second_good,
+        )
+    elif isinstance(action, MayorAction):
+        return ("mayor", *(action.people_distribution or ()))
+    return (action.type,)
+
+
+def policy_action(index: int, name: str) -> Action:
+    """The action of `name` at a policy index, out of the mayor block."""
+    assert index < MAYOR_OFFSET, "Mayor indices depend on the position."
+    type, *values = POLICY_KEYS[index]
+    return ACTION_CLASSES[type](name=name, **dict(zip(POLICY_FIELDS[type], values)))  # type: ignore
+
+
+def indexed_possibilities(
+    game: Game,
+    cap: Optional[int] = None,
+    rng: Optional[random.Random] = None,
+    include: Optional[Action] = None,
+) -> dict[int, Action]:
+    """Map the policy index of every possibility of the expected action to it.
+
+    A capped mayor may leave out some distributions: `include` makes sure that
+    a given one (e.g. the action that was actually played) gets an index.
+    """
+    possibilities = game.expected.possibilities(game.board, cap=cap, rng=rng)
+    if isinstance(game.expected, MayorAction):
+        keys = {policy_key(action): action for action in possibilities}
+        ordered = sorted(keys)[:MAYOR_SLOTS]
+        if include is not None and policy_key(include) not in ordered:
+            keys[policy_key(include)] = include
+            ordered = sorted(ordered[: MAYOR_SLOTS - 1] + [policy_key(include)])
+        return {MAYOR_OFFSET + i: keys[key] for i, key in enumerate(ordered)}
+    return {POLICY_INDEX[policy_key(action)]: action for action in possibilities}
+
+
+@lru_cache(maxsize=None)
+def observation_size() -> int:
+    return len(Board.new("ABC").asdict()) + 5 * len(Town(name="A").asdict())
+
+
+def observation(game: Game, wrt: Optional[str] = None) -> np.ndarray:
+    """Position as seen by `wrt` (the expected player by default)."""
+    output = np.zeros(observation_size(), dtype=np.float32)
+    values = game.astuple(wrt or game.expected.name)
+    output[: len(values)] = values
+    return output
+
+
+def legal_mask(indices) -> np.ndarray:
+    mask = np.zeros(NUM_ACTIONS, dtype=bool)
+    mask[list(indices)] = True
+    return mask
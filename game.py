@@ -1,33 +1,43 @@
+"""The game itself: the board, the queue of expected actions and the history.
+
+Concurrency contract (for free-threaded builds as well): the tables of
+`constants`, `encoding`, `state` and the converters are read-only and shared
+by every thread. A `Game` and its board belong to the thread that plays it;
+`take_action`, `step`, `copy`, `project` and `dumps` hold the game's own
+lock, so that a game handed between threads is never seen half-updated.
+Bots searching a game in parallel work on their own copies.
+"""
 from copy import deepcopy
 import random
-from typing import Sequence
+import threading
+import time
+from typing import Any, NamedTuple, Optional, Sequence
 
-from attr import define, asdict
-import cattrs
-from cattrs.preconf.json import make_converter
+from attr import define, asdict, field
 
-from .constants import ACTIONS
+from .constants import ACTIONS, GOODS
 
 from .pseudos import generate_pseudos
 from .actions import *
 from .boards import Board
-
-
-game_base_converter = make_converter()
-game_converter = make_converter()
+from .cargo import Fleet, Market
+from .history import History, to_history
+from .queues import ActionQueue, to_queue
 
 
 def custom_action_structure(data, cls) -> Action:
+    if not isinstance(data, dict):
+        raise ValueError(f"Invalid action: {data!r}")
     _type: str = data.get("type", "None")
     if _type in ACTIONS:
         _class = eval(f"{_type.capitalize()}Action")
-        return game_base_converter.structure(data, _class)
+        return converters().game_base_converter.structure(data, _class)
     else:
         raise ValueError(f"Invalid action type: {_type}")
 
 
 def custom_distribution_structure(data, cls) -> PeopleDistribution:
-    return list(data)
+    return to_distribution(data)
 
 
 def custom_action_unstructure(action: Action) -> dict:
@@ -38,41 +48,121 @@ def custom_distribution_unstructure(distribution: PeopleDistribution) -> list:
     return distribution
 
 
-game_converter.register_unstructure_hook(Action, custom_action_unstructure)
-game_converter.register_structure_hook(Action, custom_action_structure)
-game_base_converter.register_unstructure_hook(
-    PeopleDistribution, custom_distribution_unstructure
-)
-game_base_converter.register_structure_hook(
-    PeopleDistribution, custom_distribution_structure
-)
+class Converters(NamedTuple):
+    game_base_converter: Any  # Structures actions by their own class
+    game_converter: Any  # Games, boards and actions by their type
+
+
+_converters: Optional[Converters] = None
+_converters_lock = threading.Lock()
+
+
+def converters() -> Converters:
+    """The converters, built on first use since cattrs is slow to import.
+
+    They are built once under a lock, then shared by every thread.
+    """
+    global _converters
+    if _converters is not None:
+        return _converters
+    with _converters_lock:
+        if _converters is not None:
+            return _converters
+        from cattrs.preconf.json import make_converter
+
+        game_base_converter = make_converter()
+        game_converter = make_converter()
+        game_converter.register_unstructure_hook(Action, custom_action_unstructure)
+        game_converter.register_structure_hook(Action, custom_action_structure)
+        for sequence in (History, ActionQueue):
+            game_converter.register_unstructure_hook(
+                sequence, lambda actions: [custom_action_unstructure(action) for action in actions]
+            )
+            game_converter.register_structure_hook(
+                sequence, lambda data, cls: cls(custom_action_structure(action, Action) for action in data)
+            )
+        for converter in (game_base_converter, game_converter):
+            # As the list of goods and the dict of ships that they replace
+            converter.register_unstructure_hook(Market, list)
+            converter.register_structure_hook(Market, lambda data, cls: Market(data))
+            converter.register_unstructure_hook(
+                Fleet,
+                lambda fleet, c=converter: {size: c.unstructure(ship) for size, ship in fleet.items()},
+            )
+            converter.register_structure_hook(
+                Fleet,
+                lambda data, cls, c=converter: Fleet(
+                    {int(size): c.structure(ship, ShipData) for size, ship in data.items()}
+                ),
+            )
+        game_base_converter.register_unstructure_hook(
+            PeopleDistribution, custom_distribution_unstructure
+        )
+        game_base_converter.register_structure_hook(
+            PeopleDistribution, custom_distribution_structure
+        )
+        _converters = Converters(game_base_converter, game_converter)
+        return _converters
+
+
+def __getattr__(name: str):
+    if name in Converters._fields:
+        return getattr(converters(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @define
 class Game:
     play_order: list[str]
-    actions: Sequence[Action]
-    past_actions: list[Action]
+    actions: ActionQueue = field(converter=to_queue)  # Also accepts a list of actions
+    past_actions: History = field(converter=to_history)  # Also accepts a list of actions
     board: Board
     pseudos: dict[str, str]
+    # Legal moves of the position: move count, expected action and their keys
+    _legal: Optional[tuple[int, Action, frozenset]] = field(default=None, init=False, eq=False, repr=False)
+    lock: threading.RLock = field(factory=threading.RLock, init=False, eq=False, repr=False)
+
+    def __getstate__(self) -> dict:
+        # The lock is not part of the state: clones and unpickled games get their own
+        return {
+            name: getattr(self, name)
+            for name in ("play_order", "actions", "past_actions", "board", "pseudos")
+        }
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "lock", threading.RLock())
+        object.__setattr__(self, "_legal", None)
+
+    def __deepcopy__(self, memo: dict) -> "Game":
+        with self.lock:
+            game = memo[id(self)] = Game(**deepcopy(self.__getstate__(), memo))
+            return game
 
     @property
     def expected(self) -> Action:
         return self.actions[0]
 
+    @property
+    def is_terminal(self) -> bool:
+        """The game is over when the last governor found an endgame reason."""
+        return not self.actions
+
     @classmethod
     def loads(cls, data: str) -> "Game":
-        return game_converter.loads(data, cls)
+        return converters().game_converter.loads(data, cls)
         # return cattrs.structure(json.loads(data), cls)
 
     @classmethod
-    def start(cls, usernames: Sequence[str], shuffle=True):
+    def start(cls, usernames: Sequence[str], shuffle=True, rng: Optional[random.Random] = None):
         assert 3 <= len(usernames) <= 5, "Games are for three to five players."
+        rng = rng or random
         pseudos = generate_pseudos(usernames)
         play_order = [pseudos[name] for name in usernames]
         if shuffle:
-            random.shuffle(play_order)
-        board = Board.new(play_order, shuffle_tiles=shuffle)
+            rng.shuffle(play_order)
+        board = Board.new(play_order, shuffle_tiles=shuffle, rng=rng)
         actions = [GovernorAction(name=play_order[0])]
         return cls(
             play_order=play_order,
@@ -82,6 +172,42 @@ class Game:
             past_actions=[],
         )
 
+    @classmethod
+    def start_many(
+        cls,
+        n: int,
+        usernames: Sequence[str],
+        seeds: Optional[Sequence] = None,
+        shuffle=True,
+    ) -> list["Game"]:
+        """`n` games, the same as `Game.start(usernames, shuffle, random.Random(seed))` for every seed.
+
+        The pseudos are generated once, and the boards are copies of the
+        template of as many players, so that every game only does its shuffles.
+        Without seeds, the games use the `random` module as `Game.start` does.
+        """
+        assert 3 <= len(usernames) <= 5, "Games are for three to five players."
+        assert seeds is None or len(seeds) == n, f"Got {len(seeds)} seeds for {n} games."
+        pseudos = generate_pseudos(usernames)
+        names = [pseudos[name] for name in usernames]
+        games = []
+        for i in range(n):
+            rng = random if seeds is None else random.Random(seeds[i])
+            play_order = names[:]
+            if shuffle:
+                rng.shuffle(play_order)
+            board = Board.from_template(play_order, shuffle_tiles=shuffle, rng=rng)
+            games.append(
+                cls(
+                    play_order=play_order,
+                    actions=[GovernorAction(name=play_order[0])],
+                    board=board,
+                    pseudos=dict(pseudos),
+                    past_actions=[],
+                )
+            )
+        return games
+
     def astuple(self, wrt: str):
         output_tuple = tuple(self.board.asdict().values())
         for town in self.board.town_round_from(wrt):
@@ -89,48 +215,117 @@ class Game:
         return output_tuple
 
     def copy(self) -> "Game":
-        return Game(
-            play_order=self.play_order,
-            actions=deepcopy(self.actions),
-            board=deepcopy(self.board),
-            pseudos=self.pseudos,
-            past_actions=deepcopy(self.past_actions),
-        )
+        with self.lock:
+            return Game(
+                play_order=self.play_order,
+                actions=deepcopy(self.actions),
+                board=deepcopy(self.board),
+                pseudos=self.pseudos,
+                past_actions=self.past_actions.copy(),
+            )
 
     def dumps(self) -> str:
-        return game_converter.dumps(self)
+        with self.lock:
+            return converters().game_converter.dumps(self)
         # return json.dumps(cattrs.unstructure(self))
 
     def drop_and_merge(self, extra: Sequence[Action]):
-        actions = self.actions[1:]
-        merged = []
-        i, j = 0, 0
-        while i < len(actions):
-            if j < len(extra) and extra[j].priority > actions[i].priority:
-                merged.append(extra[j])
-                j += 1
-            else:
-                merged.append(actions[i])
-                i += 1
-        while j < len(extra):
-            merged.append(extra[j])
-            j += 1
-        self.actions = merged
+        """Drop the expected action and queue the extra ones after those of the same priority."""
+        self.actions.popleft()
+        self.actions.merge(extra)
 
     def project(self, action: Action) -> "Game":
-        game = deepcopy(self)
+        game = self.copy()
         game.take_action(action)
         return game
 
-    def take_action(self, action: Action):
+    def result(self) -> dict[str, tuple[int, ...]]:
+        """Final tally of every town, from the winner to the last.
+
+        Each value is the town's `tally_details` followed by the tie-break
+        (money plus goods left), which also decides the ordering of towns
+        with the same value.
+        """
+        scores = {
+            town.name: town.tally_details()
+            + (town.money + sum(town.count(good) for good in GOODS),)
+            for town in self.board.towns.values()
+        }
+        ranking = sorted(
+            scores, key=lambda name: (scores[name][0], scores[name][-1]), reverse=True
+        )
+        return {name: scores[name] for name in ranking}
+
+    def step(self, action: Action, trusted: bool = False) -> bool:
+        """Take an action (if the game is not over) and tell whether the game is over."""
+        with self.lock:
+            if not self.is_terminal:
+                self.take_action(action, trusted)
+            return self.is_terminal
+
+    def legal_keys(self) -> frozenset:
+        """Keys of the possibilities of the expected action, cached until the next move."""
+        with self.lock:
+            expected = self.expected
+            legal = self._legal
+            if legal is None or legal[0] != len(self.past_actions) or legal[1] is not expected:
+                keys = frozenset(action.key() for action in expected.possibilities(self.board))
+                legal = self._legal = (len(self.past_actions), expected, keys)
+            return legal[2]
+
+    def validate(self, action: Action):
+        """Raise IllegalAction unless the action is one of the possibilities of the expected one.
+
+        Unlike the asserts of `react`, the check holds under `python -O`.
+        """
+        if self.is_terminal:
+            raise GameOver(self.board.endgame_reason)
         expected = self.expected
-        assert (
-            expected.type == action.type and expected.name == action.name
-        ), f"Action {action} doesn't respond to {expected}."
-        self.board, extra = action.react(self.board)
-        self.past_actions.append(action)
-        self.drop_and_merge(extra)
+        if not isinstance(action, Action) or (action.type, action.name) != (expected.type, expected.name):
+            raise IllegalAction(f"Action {action} doesn't respond to {expected}.")
+        if isinstance(action, MayorAction):
+            # Checked in O(holders): listing the distributions can take seconds
+            action.check(self.board)
+            return
+        try:
+            legal = action.key() in self.legal_keys()
+        except TypeError:  # Unhashable field values
+            legal = False
+        if not legal:
+            raise IllegalAction(f"Action {action} is not possible.")
+
+    def take_action(self, action: Action, trusted: bool = False):
+        """Play the action; `trusted` skips the checks for actions from `possibilities`."""
+        with self.lock:
+            if self.is_terminal:
+                raise GameOver(self.board.endgame_reason)
+            expected = self.expected
+            assert trusted or (
+                expected.type == action.type and expected.name == action.name
+            ), f"Action {action} doesn't respond to {expected}."
+            self.board, extra = action.react(self.board, trusted)
+            self.past_actions.append(action)
+            self.drop_and_merge(extra)
 
     def current_round(self):
         wrt = self.board.get_governor_name() or self.expected.name
         return self.board.town_round_from(wrt)
+
+
+def benchmark(games: int = 10000, seed: int = 0) -> dict[str, float]:
+    """New games per second, with `Game.start` and with `Game.start_many`."""
+    usernames = ["Aaron", "Bard", "Carl", "Dave"]
+    seeds = [f"{seed}/{i}" for i in range(games)]
+    start = time.perf_counter()
+    for s in seeds:
+        Game.start(usernames, rng=random.Random(s))
+    start_per_second = games / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    Game.start_many(games, usernames, seeds)
+    start_many_per_second = games / (time.perf_counter() - start)
+    return {"start_per_second": start_per_second, "start_many_per_second": start_many_per_second}
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,170 @@
+"""Compact log of the past actions of a game.
+
+Every action is a run of integers in an append-only array: its type, its
+player, then its own fields. Copies of a game share the log up to their
+branch point: a history only sees the first `length` actions of the log,
+and forks the log before appending when another copy already appended past
+them. Copying a history is then O(1), whatever the length of the game.
+"""
+import threading
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Union, overload
+
+from attr import fields
+
+from .actions import ACTION_CLASSES, Action
+from .constants import ACTIONS, BUILDINGS, GOODS, ROLES, TILES
+
+# Strings that action fields can hold
+WORDS = ("home", *ROLES, *TILES, *BUILDINGS, *GOODS)
+WORD_CODES = {word: i for i, word in enumerate(WORDS)}
+OWN_FIELDS = {
+    type: tuple(f.name for f in fields(cls) if f.name not in ("name", "type", "priority"))
+    for type, cls in ACTION_CLASSES.items()
+}
+
+
+def encode_value(value) -> int:
+    """None, booleans and words are 0, 1, 2 and up; counts are negative."""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1 + value
+    if isinstance(value, int):
+        return -1 - value
+    return 3 + WORD_CODES[value]
+
+
+def decode_value(code: int):
+    if code < 0:
+        return -1 - code
+    if code < 3:
+        return (None, False, True)[code]
+    return WORDS[code - 3]
+
+
+class Log:
+    """The storage shared by histories: codes, where actions start, and player names."""
+
+    __slots__ = ("codes", "starts", "names", "name_codes", "lock")
+
+    def __init__(self):
+        self.codes = array("i")
+        self.starts = array("q")
+        self.names: list[str] = []
+        self.name_codes: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def fork(self, length: int) -> "Log":
+        log = Log()
+        log.starts = self.starts[:length]
+        log.codes = self.codes[: self.starts[length]] if length < len(self.starts) else self.codes[:]
+        log.names = self.names[:]
+        log.name_codes = dict(self.name_codes)
+        return log
+
+    def encode(self, action: Action):
+        if action.name not in self.name_codes:
+            self.name_codes[action.name] = len(self.names)
+            self.names.append(action.name)
+        self.starts.append(len(self.codes))
+        self.codes.append(ACTIONS.index(action.type))
+        self.codes.append(self.name_codes[action.name])
+        for field in OWN_FIELDS[action.type]:
+            value = getattr(action, field)
+            if field == "people_distribution" and value is not None:
+                self.codes.append(encode_value(len(value)))
+                for holder, amount in value:
+                    self.codes.extend((encode_value(holder), encode_value(amount)))
+            else:
+                self.codes.append(encode_value(value))
+
+    def decode(self, index: int) -> Action:
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.codes)
+        codes = iter(self.codes[self.starts[index] : end])
+        type = ACTIONS[next(codes)]
+        name = self.names[next(codes)]
+        values = {}
+        for field in OWN_FIELDS[type]:
+            value = decode_value(next(codes))
+            if field == "people_distribution" and value is not None:
+                value = [(decode_value(next(codes)), decode_value(next(codes))) for _ in range(value)]
+            values[field] = value
+        return ACTION_CLASSES[type](name=name, **values)  # type: ignore
+
+
+class History(Sequence):
+    """The past actions of a game, as a read-only sequence that can be appended to."""
+
+    __slots__ = ("log", "length")
+
+    def __init__(self, actions: Iterable[Action] = ()):
+        self.log = Log()
+        self.length = 0
+        for action in actions:
+            self.append(action)
+
+    def append(self, action: Action):
+        with self.log.lock:
+            log = self.log
+            if len(log.starts) != self.length:
+                # Another copy appended after our last action
+                self.log = log = log.fork(self.length)
+            log.encode(action)
+        self.length += 1
+
+    def copy(self) -> "History":
+        history = History.__new__(History)
+        history.log = self.log
+        history.length = self.length
+        return history
+
+    def __copy__(self) -> "History":
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> "History":
+        copied = memo[id(self)] = self.copy()
+        return copied
+
+    def __reduce__(self):
+        return History, (list(self),)
+
+    def __len__(self) -> int:
+        return self.length
+
+    @overload
+    def __getitem__(self, index: int) -> Action:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Action]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("History index out of range.")
+        with self.log.lock:
+            return self.log.decode(index)
+
+    def __iter__(self) -> Iterator[Action]:
+        for index in range(self.length):
+            yield self[index]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (History, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"History({list(self)!r})"
+
+
+def to_history(actions: Iterable[Action]) -> History:
+    return actions if isinstance(actions, History) else History(actions)
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import Executor
+from typing import Any, Optional, Protocol, Sequence
+
+from attr import Factory, define
+
+from .actions import Action, GameOver, IllegalAction
+from .diffs import DiffStream
+from .game import Game, converters
+
+
+class Bot(Protocol):
+    name: str
+
+    def decide(self, game: Game) -> Action:
+        ...
+
+
+def p99(samples: deque[float]) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+
+class HostMetrics:
+    """Moves throughput and latency of a host, over a sliding window of moves.
+
+    The latency of a move runs from the moment it is expected to the moment it
+    is applied, waiting for remote players included. The engine time leaves
+    the waits out: it is the time a bot spent deciding (if any) plus the time
+    spent applying the move.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.moves = 0
+        self.started = time.perf_counter()
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.engine_times: deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float, engine_time: Optional[float] = None):
+        self.moves += 1
+        self.latencies.append(latency)
+        self.engine_times.append(latency if engine_time is None else engine_time)
+
+    def moves_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.moves / elapsed if elapsed > 0 else 0.0
+
+    def p99_latency(self) -> float:
+        return p99(self.latencies)
+
+    def p99_engine_time(self) -> float:
+        return p99(self.engine_times)
+
+    def asdict(self) -> dict[str, float]:
+        return {
+            "moves": self.moves,
+            "moves_per_second": self.moves_per_second(),
+            "p99_latency": self.p99_latency(),
+            "p99_engine_time": self.p99_engine_time(),
+        }
+
+
+@define
+class Table:
+    game: Game
+    bots: dict[str, Bot]  # Seats without a bot wait for `GameHost.submit`
+    lock: asyncio.Lock = Factory(asyncio.Lock)
+    pending: Optional[asyncio.Future] = None
+    stream: DiffStream = Factory(lambda self: DiffStream(self.game), takes_self=True)
+    # The diffs of the last moves, for clients that poll
+    diffs: deque[dict[str, Any]] = Factory(deque)
+
+
+class GameHost:
+    """Many games in one process, each played by its own asyncio task.
+
+    Moves of a table are applied one at a time under the table lock. Bot
+    decisions run in `executor` (the loop default when None), while remote
+    players (humans or clients on the unix socket) submit their moves. A
+    player that does not answer within `timeout` seconds plays the first
+    possibility of the expected action. Tables keep the diffs of their last
+    `max_diffs` moves: clients that fall further behind load the state again.
+    """
+
+    def __init__(
+        self, executor: Optional[Executor] = None, timeout: float = 30.0, max_diffs: int = 1024
+    ):
+        self.executor = executor
+        self.timeout = timeout
+        self.max_diffs = max_diffs
+        self.tables: dict[str, Table] = {}
+        self.metrics = HostMetrics()
+
+    def open_table(
+        self, table_id: str, usernames: Sequence[str], bots: Sequence[Bot] = (), **kwargs
+    ) -> Game:
+        assert table_id not in self.tables, f"Table {table_id} already exists."
+        game = Game.start(usernames, **kwargs)
+        self.tables[table_id] = Table(
+            game=game, bots={bot.name: bot for bot in bots}, diffs=deque(maxlen=self.max_diffs)
+        )
+        return game
+
+    def close_table(self, table_id: str) -> Game:
+        table = self.tables.pop(table_id)
+        if table.pending is not None:
+            table.pending.cancel()
+        table.stream.close()
+        return table.game
+
+    async def decision(self, table: Table) -> tuple[Action, float]:
+        """The next move, and the time that a bot spent on it (0 for remote players)."""
+        game = table.game
+        name = game.expected.name
+        if name in table.bots:
+            bot, position = table.bots[name], game.copy()
+
+            def decide() -> tuple[Action, float]:
+                start = time.perf_counter()
+                return bot.decide(position), time.perf_counter() - start
+
+            # Bots decide on a copy: one that times out can't see (or break) the moves that follow
+            future = asyncio.get_running_loop().run_in_executor(self.executor, decide)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(lambda done: done.cancelled() or done.exception())
+                raise
+        table.pending = asyncio.get_running_loop().create_future()
+        try:
+            return await table.pending, 0.0
+        finally:
+            table.pending = None
+
+    async def play(self, table_id: str) -> Game:
+        """Play the table until game over."""
+        table = self.tables[table_id]
+        game = table.game
+        while not game.is_terminal:
+            start = time.perf_counter()
+            action: Optional[Action]
+            try:
+                action, thinking = await asyncio.wait_for(self.decision(table), self.timeout)
+            except asyncio.TimeoutError:
+                action, thinking = None, 0.0
+            async with table.lock:
+                applying = time.perf_counter()
+                if action is None:
+                    action = game.expected.possibilities(game.board, cap=1)[0]
+                table.diffs.append(table.stream.step(action))  # type: ignore
+            end = time.perf_counter()
+            # Waiting for remote players, the executor or the lock is not engine time
+            self.metrics.record(end - start, thinking + end - applying)
+        return game
+
+    async def play_all(self) -> dict[str, Game]:
+        table_ids = list(self.tables)
+        games = await asyncio.gather(*(self.play(table_id) for table_id in table_ids))
+        return dict(zip(table_ids, games))
+
+    def submit(self, table_id: str, action: Action):
+        """Deliver the move of a remote player to the table."""
+        table = self.tables[table_id]
+        pending = table.pending
+        if pending is None or pending.done():
+            raise IllegalAction(f"Table {table_id} is not waiting for {action.name}.")
+        table.game.validate(action)
+        pending.set_result(action)
+
+    async def state(self, table_id: str) -> str:
+        table = self.tables[table_id]
+        async with table.lock:
+            return table.game.dumps()
+
+    async def handle(self, request: Any) -> dict[str, Any]:
+        """Answer one request of the line-based JSON protocol.
+
+        Malformed requests get an error answer, and never end the connection.
+        """
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Requests are JSON objects."}
+        op = request.get("op")
+        if op == "metrics":
+            return {"ok": True, "metrics": self.metrics.asdict()}
+        table_id = request.get("table")
+        if not isinstance(table_id, str) or table_id not in self.tables:
+            return {"ok": False, "error": f"No table {table_id}."}
+        if op == "state":
+            table = self.tables[table_id]
+            return {
+                "ok": True,
+                "state": await self.state(table_id),
+                "waiting": table.pending is not None,
+            }
+        elif op == "diffs":
+            # Moves since the client's last poll, to apply with `diffs.apply_diff`
+            table = self.tables[table_id]
+            since = request.get("since", 0)
+            if not isinstance(since, int) or isinstance(since, bool) or since < 0:
+                return {"ok": False, "error": f"Invalid since {since!r}."}
+            moves = len(table.game.past_actions)
+            first = moves - len(table.diffs)
+            if since < first:
+                return {"ok": False, "error": f"No diffs before move {first}: load the state."}
+            return {"ok": True, "diffs": list(islice(table.diffs, since - first, None)), "moves": moves}
+        elif op == "move":
+            from cattrs.errors import BaseValidationError
+
+            try:
+                action = converters().game_converter.structure(request["action"], Action)
+                self.submit(table_id, action)
+            except (
+                BaseValidationError,
+                GameOver,
+                IndexError,
+                KeyError,
+                TypeError,
+                ValueError,
+            ) as err:
+                return {"ok": False, "error": f"{type(err).__name__}: {err}"}
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown op {op}."}
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handle(json.loads(line))
+                except ValueError as err:  # Not JSON, or not UTF-8
+                    response = {"ok": False, "error": str(err)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve_unix(self, path: str, backlog: int = 1024) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self.serve_client, path=path, backlog=backlog)
+
+
+async def rufus_client(path: str, table_id: str, name: str, deadline: float, poll: float = 0.02):
+    """A remote player of the table, that plays as Rufus over the unix socket until the deadline.
+
+    It loads the game once, then follows it with the diffs of the moves.
+    """
+    from .bots.rufus import Rufus
+    from .diffs import apply_diff
+
+    bot = Rufus(name)
+    reader, writer = await asyncio.open_unix_connection(path, limit=2**24)
+
+    async def ask(request: dict[str, Any]) -> dict[str, Any]:
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    try:
+        response = await ask({"op": "state", "table": table_id})
+        game = Game.loads(response["state"])
+        moves = len(game.past_actions)
+        while not game.is_terminal and time.perf_counter() < deadline:
+            response = await ask({"op": "diffs", "table": table_id, "since": moves})
+            if not response["ok"]:  # Too far behind
+                game = Game.loads((await ask({"op": "state", "table": table_id}))["state"])
+                moves = len(game.past_actions)
+                continue
+            for diff in response["diffs"]:
+                apply_diff(game, diff)
+            moves = response["moves"]
+            if not game.is_terminal and game.expected.name == name:
+                action = converters().game_converter.unstructure(bot.decide(game), Action)
+                if (await ask({"op": "move", "table": table_id, "action": action}))["ok"]:
+                    continue
+            await asyncio.sleep(poll)
+    finally:
+        writer.close()
+
+
+def benchmark(tables: int = 1000, seconds: float = 20.0) -> dict[str, float]:
+    """Host metrics with one Rufus client over the unix socket per table, the other seats bots."""
+    import os
+    import tempfile
+
+    from .bots.rufus import Rufus
+
+    async def run(path: str) -> dict[str, float]:
+        host = GameHost()
+        clients = []
+        deadline = time.perf_counter() + seconds
+        server = await host.serve_unix(path)
+        for i in range(tables):
+            game = host.open_table(f"t{i}", ["Aaron", "Bard", "Carl", "Dave"])
+            host.tables[f"t{i}"].bots = {name: Rufus(name) for name in game.play_order[1:]}
+            clients.append(rufus_client(path, f"t{i}", game.play_order[0], deadline))
+        playing = [asyncio.create_task(host.play(f"t{i}")) for i in range(tables)]
+        await asyncio.gather(*clients)
+        for task in playing:
+            task.cancel()
+        server.close()
+        return host.metrics.asdict()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(run(os.path.join(tmp, "host.sock")))
+
+
+if __name__ == "__main__":
+    print(benchmark())
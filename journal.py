@@ -0,0 +1,46 @@
+"""What a move changed on a board, for `diffs.DiffStream`.
+
+While a journal is attached to a board, its changes are noted by path, next
+to the keys that changed:
+
+- `()`: fields of the board, noted by the `journaled` hook on assignment;
+- `("towns", name)`: fields of a town, noted the same way;
+- `("towns", name, "tiles")` and `("towns", name, "buildings")`: entries of
+  the workplaces, noted by `Workplaces`;
+- `("roles",)` and `("unbuilt",)`: entries noted by the board methods that
+  change them, which also note the tile lists they change in place.
+
+The market and the fleet change in place without noting it: `DiffStream`
+compares their counts, as they are few and small. Boards without a
+journal (copies, unpickled boards, search) pay one attribute check per
+assignment.
+"""
+from typing import Any, Hashable
+
+
+class Journal:
+    __slots__ = ("changes",)
+
+    def __init__(self):
+        self.changes: dict[tuple[str, ...], set[Hashable]] = {}
+
+    def note(self, path: tuple[str, ...], key: Hashable):
+        changes = self.changes.get(path)
+        if changes is None:
+            changes = self.changes[path] = set()
+        changes.add(key)
+
+    def clear(self):
+        self.changes.clear()
+
+    def __reduce__(self):
+        # Journals belong to a stream: copies and unpickled boards have none
+        return type(None), ()
+
+
+def journaled(instance: Any, attribute: Any, value: Any) -> Any:
+    """`on_setattr` hook of boards and towns."""
+    journal = instance.journal
+    if journal is not None:
+        journal.note(instance.journal_path(), attribute.name)
+    return value
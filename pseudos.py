@@ -1,19 +1,24 @@
 from dataclasses import dataclass
+import functools
 import re
-from typing import Sequence
+from types import MappingProxyType
+from typing import Iterable, Mapping, Sequence
+
+# Usernames whose relevance table is kept, least recently used first out
+RELEVANCE_CACHE_SIZE = 4096
 
 
 @dataclass
 class Pseudo:
     name: str  # Original name
-    relevance: dict[str, int]  # Relevance of chars occuring in the name
+    relevance: Mapping[str, int]  # Relevance of chars occuring in the name
     major: str  # First char of the pseudo
     minor: str  # Second char of the pseudo
     avoid: set  # Excluded chars to avoid collision, used during construction
 
     def __init__(self, name, avoid=None):
         self.name = name = name.strip()
-        self.relevance = get_relevance(name)
+        self.relevance = relevance_table(name)
         self.avoid = set() if avoid is None else avoid
         if name[0].isalpha():
             self.major = name[0].upper()
@@ -59,7 +64,7 @@ def split_on_whitespace_and_case(text: str) -> list[str]:
 
 def get_relevance(name: str) -> dict[str, int]:
     parts = [part.capitalize() for part in split_on_whitespace_and_case(name)]
-    chars = {char for part in parts for char in part}
+    chars = dict.fromkeys(char for part in parts for char in part)  # Keep ties stable
     return {
         char: min(
             (
@@ -74,6 +79,12 @@ def get_relevance(name: str) -> dict[str, int]:
     }
 
 
+@functools.lru_cache(maxsize=RELEVANCE_CACHE_SIZE)
+def relevance_table(name: str) -> Mapping[str, int]:
+    """`get_relevance`, cached and read-only: lobbies see the same usernames again and again."""
+    return MappingProxyType(get_relevance(name))
+
+
 def generate_pseudos(usernames: Sequence[str]) -> dict[str, str]:
     pseudos = {Pseudo(name) for name in usernames}
     majors = {ps.major for ps in pseudos}
@@ -106,9 +117,49 @@ def avoid_collisions(group: set[Pseudo]) -> set[Pseudo]:
     return group
 
 
+class Roster:
+    """The pseudos of players joining and leaving, the same as `generate_pseudos` of them.
+
+    Pseudos only collide with those of the same major, so a player joining or
+    leaving only changes the pseudos of their major group (and the numbers of
+    the undefined minors, that follow the order of all names).
+    """
+
+    def __init__(self, usernames: Iterable[str] = ()):
+        self.groups: dict[str, set[Pseudo]] = {}  # By major
+        for name in usernames:
+            self.add(name)
+
+    def add(self, username: str) -> dict[str, str]:
+        pseudo = Pseudo(username)
+        group = self.groups.get(pseudo.major, set())
+        if any(ps.name == pseudo.name for ps in group):
+            return self.pseudos()
+        self.update(pseudo.major, [ps.name for ps in group] + [pseudo.name])
+        return self.pseudos()
+
+    def remove(self, username: str) -> dict[str, str]:
+        pseudo = Pseudo(username)
+        group = self.groups.get(pseudo.major, set())
+        names = [ps.name for ps in group if ps.name != pseudo.name]
+        if len(names) == len(group):
+            raise KeyError(username)
+        self.update(pseudo.major, names)
+        return self.pseudos()
+
+    def update(self, major: str, names: list[str]):
+        if names:
+            self.groups[major] = avoid_collisions({Pseudo(name) for name in names})
+        else:
+            del self.groups[major]
+
+    def pseudos(self) -> dict[str, str]:
+        return fix_undefined_minors({ps for group in self.groups.values() for ps in group})
+
+
 def fix_undefined_minors(group: set[Pseudo]) -> dict[str, str]:
     pseudos = dict()
-    for i, ps in enumerate(group):
+    for i, ps in enumerate(sorted(group, key=lambda ps: ps.name)):
         if ps.minor == "@":
             pseudos[ps.name] = ps.major + str(i + 1)
         else:
@@ -0,0 +1,101 @@
+"""Queue of the actions that a game expects next.
+
+The queue is always ordered by decreasing priority, then by arrival, and
+the extra actions of a move come by decreasing priority as well. Every
+priority then has its own deque: dropping the expected action and merging
+the extra ones cost O(len(extra)) instead of a copy of the whole queue.
+"""
+from collections import deque
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Union, overload
+
+from attr import fields
+
+from .actions import ACTION_CLASSES, Action
+
+MAX_PRIORITY = max(fields(cls).priority.default for cls in ACTION_CLASSES.values())
+
+
+class ActionQueue(Sequence):
+    """Pending actions, the expected one first."""
+
+    __slots__ = ("buckets", "size")
+
+    def __init__(self, actions: Iterable[Action] = ()):
+        self.buckets: list[deque[Action]] = [deque() for _ in range(MAX_PRIORITY + 1)]
+        self.size = 0
+        self.merge(actions)
+
+    def merge(self, extra: Iterable[Action]):
+        """Queue actions after those of the same priority, as `Game.drop_and_merge` does.
+
+        Raise ValueError, and queue nothing, unless they come by decreasing
+        priority: in any other order, they would be queued in another turn order.
+        """
+        if not isinstance(extra, (list, tuple)):
+            extra = list(extra)
+        last = MAX_PRIORITY
+        for action in extra:
+            if action.priority > last:
+                raise ValueError(f"Actions {extra} are not by decreasing priority.")
+            last = action.priority
+        for action in extra:
+            self.buckets[action.priority].append(action)
+        self.size += len(extra)
+
+    def popleft(self) -> Action:
+        for bucket in reversed(self.buckets):
+            if bucket:
+                self.size -= 1
+                return bucket.popleft()
+        raise IndexError("pop from an empty queue")
+
+    def copy(self) -> "ActionQueue":
+        queue = ActionQueue.__new__(ActionQueue)
+        queue.buckets = [bucket.copy() for bucket in self.buckets]
+        queue.size = self.size
+        return queue
+
+    def __reduce__(self):
+        return ActionQueue, (list(self),)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @overload
+    def __getitem__(self, index: int) -> Action:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Action]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("queue index out of range")
+        for bucket in reversed(self.buckets):
+            if index < len(bucket):
+                return bucket[index]
+            index -= len(bucket)
+
+    def __iter__(self) -> Iterator[Action]:
+        for bucket in reversed(self.buckets):
+            yield from bucket
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (ActionQueue, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"ActionQueue({list(self)!r})"
+
+
+def to_queue(actions: Iterable[Action]) -> ActionQueue:
+    return actions if isinstance(actions, ActionQueue) else ActionQueue(actions)
@@ -0,0 +1,85 @@
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from .constants import *
+from .towns import Town
+
+# Static per-building tables, aligned with BUILDINGS
+TIER = np.array([BUILD_INFO[b]["tier"] for b in BUILDINGS], dtype=np.int64)
+SPACE = np.array([BUILD_INFO[b]["space"] for b in BUILDINGS], dtype=np.int64)
+IS_NONPROD = np.array([b in NONPROD_BUILDINGS for b in BUILDINGS], dtype=np.int64)
+GUILD_HALL_VALUE = np.array(
+    [
+        1 if b in ("small_indigo_plant", "small_sugar_mill") else 2 if b in PROD_BUILDINGS else 0
+        for b in BUILDINGS
+    ],
+    dtype=np.int64,
+)
+CITY_HALL, CUSTOM_HOUSE, FORTRESS, GUILD_HALL, RESIDENCE = (
+    BUILDINGS.index(b)
+    for b in ("city_hall", "custom_house", "fortress", "guild_hall", "residence")
+)
+
+
+class TownBatch(NamedTuple):
+    """Array encoding of many towns, one row per town.
+
+    `tiles` and `buildings` have shape (n, len(TILES), 2) and (n, len(BUILDINGS), 2),
+    the last axis being (placed, worked) in the order of TILES and BUILDINGS.
+    `people` counts only the colonists at home, as in `Town.people`.
+    """
+
+    points: np.ndarray
+    people: np.ndarray
+    tiles: np.ndarray
+    buildings: np.ndarray
+
+
+def encode_towns(towns: Iterable[Town]) -> TownBatch:
+    towns = list(towns)
+    return TownBatch(
+        points=np.array([town.points for town in towns], dtype=np.int64),
+        people=np.array([town.people for town in towns], dtype=np.int64),
+        tiles=np.array(
+            [[tuple(town.tiles[tile]) for tile in TILES] for town in towns],
+            dtype=np.int64,
+        ).reshape(len(towns), len(TILES), 2),
+        buildings=np.array(
+            [[tuple(town.buildings[b]) for b in BUILDINGS] for town in towns],
+            dtype=np.int64,
+        ).reshape(len(towns), len(BUILDINGS), 2),
+    )
+
+
+def tally_batch(batch: TownBatch) -> np.ndarray:
+    """Vectorized `Town.tally_details`, one row of the (n, 8) result per town."""
+    points = batch.points
+    placed = batch.buildings[:, :, 0] > 0
+    worked = batch.buildings[:, :, 1]
+    privilege = worked >= SPACE
+    worked_tiles = batch.tiles[:, :, 1].sum(axis=1)
+
+    buildings = placed @ TIER
+    city_hall = privilege[:, CITY_HALL] * (placed @ IS_NONPROD)
+    custom_house = privilege[:, CUSTOM_HOUSE] * (points // 4)
+    fortress = privilege[:, FORTRESS] * (
+        (batch.people + worked_tiles + worked.sum(axis=1)) // 3
+    )
+    guild_hall = privilege[:, GUILD_HALL] * (placed @ GUILD_HALL_VALUE)
+    residence = privilege[:, RESIDENCE] * np.maximum(4, worked_tiles - 5)
+
+    value = points + buildings + guild_hall + residence + fortress + custom_house + city_hall
+    return np.stack(
+        [
+            value,
+            points,
+            buildings,
+            city_hall,
+            custom_house,
+            fortress,
+            guild_hall,
+            residence,
+        ],
+        axis=1,
+    )
@@ -0,0 +1,98 @@
+from concurrent.futures import Executor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterable, Optional, Sequence
+
+import numpy as np
+
+from .game import Game
+from .state import MAX_PLAYERS, STATE_SIZE, decode_state, encode_state
+
+# Per-seat results of a slot, e.g. the values estimated by a search
+Work = Callable[[Game], Sequence[float]]
+
+
+class SharedGamePool:
+    """Game positions in shared memory, one slot per position.
+
+    Slots hold `state.encode_state` arrays and a row of per-seat results.
+    Pickling a pool only sends the name of its shared memory block, so worker
+    processes attach to the same memory and read and write slots in place.
+    """
+
+    def __init__(self, size: int, name: Optional[str] = None):
+        self.size = size
+        offset = (size * STATE_SIZE * 4 + 7) // 8 * 8  # Align the results
+        nbytes = offset + size * MAX_PLAYERS * 8
+        self.owner = name is None
+        if self.owner:
+            self.shm = SharedMemory(create=True, size=nbytes)
+        else:
+            # Workers share the resource tracker of the creator, which unlinks the block
+            self.shm = SharedMemory(name=name)
+        self.states = np.ndarray((size, STATE_SIZE), dtype=np.int32, buffer=self.shm.buf)
+        self.results = np.ndarray(
+            (size, MAX_PLAYERS),
+            dtype=np.float64,
+            buffer=self.shm.buf,
+            offset=offset,
+        )
+
+    def __getstate__(self):
+        return (self.shm.name, self.size)
+
+    def __setstate__(self, state):
+        name, size = state
+        self.__init__(size, name=name)
+
+    def __getitem__(self, index: int) -> Game:
+        return decode_state(self.states[index])
+
+    def __setitem__(self, index: int, game: Game):
+        encode_state(game, out=self.states[index])
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        del self.states, self.results
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def work(self, index: int, work: Work, write_back: bool = False):
+        """Run `work` on a slot and store its per-seat results in place."""
+        game = self[index]
+        values = work(game)
+        self.results[index, : len(values)] = values
+        if write_back:
+            self[index] = game
+
+    def map(
+        self,
+        work: Work,
+        indices: Iterable[int],
+        executor: Executor,
+        write_back: bool = False,
+    ):
+        """Run `work` on many slots in the executor, usually a process pool."""
+        futures = [
+            executor.submit(_work_in_worker, self.shm.name, self.size, index, work, write_back)
+            for index in indices
+        ]
+        for future in futures:
+            future.result()
+
+
+_attached: dict[str, SharedGamePool] = {}
+
+
+def _work_in_worker(name: str, size: int, index: int, work: Work, write_back: bool):
+    if name not in _attached:
+        _attached[name] = SharedGamePool(size, name=name)
+    _attached[name].work(index, work, write_back)
@@ -0,0 +1,185 @@
+"""Lossless flat integer encoding of game positions.
+
+A position is the board, the towns and the queue of pending actions, which
+are always bare prompts (a type and a player). The history of past actions
+and the usernames behind the pseudos are not part of it.
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .actions import *
+from .boards import Board
+from .constants import *
+from .game import Game
+from .towns import Town
+from .utils import RoleData, ShipData, WorkplaceData
+
+MAX_PLAYERS = 5
+NAME_WIDTH = 4
+EXPOSED_SLOTS = 8
+UNSETTLED_SLOTS = 56
+QUEUE_SLOTS = 32
+ENDGAME_REASONS = ("money", "people", "points", "building_space")
+SEAT_NAMES = tuple(f"P{i}" for i in range(MAX_PLAYERS))  # Names of the canonical seats
+TOWN_SIZE = 4 + 3 + len(GOODS) + 2 * len(TILES) + 2 * len(BUILDINGS)
+BOARD_SIZE = (
+    3
+    + len(GOODS)
+    + 3
+    + 2 * len(ROLES)
+    + 3 * 3
+    + 4
+    + len(BUILDINGS)
+    + 1
+    + EXPOSED_SLOTS
+    + 1
+    + UNSETTLED_SLOTS
+)
+HEADER_SIZE = 1 + MAX_PLAYERS * NAME_WIDTH
+QUEUE_SIZE = 1 + 2 * QUEUE_SLOTS
+STATE_SIZE = HEADER_SIZE + BOARD_SIZE + MAX_PLAYERS * TOWN_SIZE + QUEUE_SIZE
+
+
+def code(value, values: tuple) -> int:
+    """Goods, tiles, roles... are stored as 1 + their index, 0 meaning None."""
+    return 0 if value is None else values.index(value) + 1
+
+
+def uncode(value: int, values: tuple):
+    return None if value == 0 else values[value - 1]
+
+
+def encode_state(
+    game: Game,
+    out: Optional[np.ndarray] = None,
+    seats: Optional[Sequence[str]] = None,
+    sort_tiles: bool = False,
+) -> np.ndarray:
+    """The position as `STATE_SIZE` integers.
+
+    With `seats`, the towns come in that order and are named after their seat,
+    which encodes `canonical.canonical_game` without building it. With
+    `sort_tiles`, the order of the tile lists doesn't count.
+    """
+    board = game.board
+    names = list(board.towns) if seats is None else list(seats)
+    labels = names if seats is None else SEAT_NAMES
+    assert len(game.actions) <= QUEUE_SLOTS, "Too many pending actions."
+    data = [len(names)]
+    for i in range(MAX_PLAYERS):
+        name = labels[i] if i < len(names) else ""
+        assert len(name) <= NAME_WIDTH, f"Name {name} is too long."
+        data.extend(ord(char) for char in name.ljust(NAME_WIDTH, "\0"))
+
+    data.extend((board.money, board.people, board.points))
+    data.extend(board.count(good) for good in GOODS)
+    data.extend((board.people_ship, board.unsettled_quarries, code(board.endgame_reason, ENDGAME_REASONS)))
+    for role in ROLES:
+        data.extend((board.roles[role].available, board.roles[role].money))
+    fleet = board.goods_fleet
+    for size, good, amount in zip(fleet.sizes, fleet.goods, fleet.amounts):
+        data.extend((size, good + 1, amount))  # Goods of ships are -1 for none
+    data.extend(code(good, GOODS) for good in board.market)
+    data.extend([0] * (4 - len(board.market)))
+    data.extend(board.unbuilt[building] for building in BUILDINGS)
+    for tiles, slots in ((board.exposed_tiles, EXPOSED_SLOTS), (board.unsettled_tiles, UNSETTLED_SLOTS)):
+        data.append(len(tiles))
+        if sort_tiles:  # As strings: `TILES` is in alphabetical order
+            data.extend(sorted(code(tile, TILES) for tile in tiles))
+        else:
+            data.extend(code(tile, TILES) for tile in tiles)
+        data.extend([0] * (slots - len(tiles)))
+
+    for name in names:
+        town = board.towns[name]
+        data.extend((town.gov, town.spent_captain, town.spent_wharf, code(town.role, ROLES)))
+        data.extend((town.money, town.people, town.points))
+        data.extend(town.count(good) for good in GOODS)
+        for tile in TILES:
+            data.extend(town.tiles[tile])
+        for building in BUILDINGS:
+            data.extend(town.buildings[building])
+    data.extend([0] * ((MAX_PLAYERS - len(names)) * TOWN_SIZE))
+
+    data.append(len(game.actions))
+    for action in game.actions:
+        data.extend((code(action.type, ACTIONS), names.index(action.name)))
+    data.extend([0] * (2 * (QUEUE_SLOTS - len(game.actions))))
+
+    if out is None:
+        out = np.empty(STATE_SIZE, dtype=np.int32)
+    out[:] = data
+    return out
+
+
+def decode_state(state: np.ndarray) -> Game:
+    data = iter(state.tolist())
+
+    def take(n: int) -> list[int]:
+        return [next(data) for _ in range(n)]
+
+    num_players = next(data)
+    names = ["".join(chr(c) for c in take(NAME_WIDTH) if c) for _ in range(MAX_PLAYERS)]
+    names = names[:num_players]
+
+    money, people, points = take(3)
+    goods = dict(zip(GOODS, take(len(GOODS))))
+    people_ship, unsettled_quarries, endgame_reason = take(3)
+    roles = {role: RoleData(*take(2)) for role in ROLES}
+    goods_fleet = {}
+    for _ in range(3):
+        size, good, amount = take(3)
+        goods_fleet[size] = ShipData(size, uncode(good, GOODS), amount)
+    market = [uncode(good, GOODS) for good in take(4) if good]
+    unbuilt = dict(zip(BUILDINGS, take(len(BUILDINGS))))
+    tile_lists = []
+    for slots in (EXPOSED_SLOTS, UNSETTLED_SLOTS):
+        length = next(data)
+        tile_lists.append([uncode(tile, TILES) for tile in take(slots)[:length]])
+
+    towns = {}
+    for name in names:
+        gov, spent_captain, spent_wharf, role = take(4)
+        town_money, town_people, town_points = take(3)
+        town_goods = dict(zip(GOODS, take(len(GOODS))))
+        tiles = {tile: WorkplaceData(*take(2)) for tile in TILES}
+        buildings = {building: WorkplaceData(*take(2)) for building in BUILDINGS}
+        towns[name] = Town(
+            name=name,
+            gov=bool(gov),
+            spent_captain=bool(spent_captain),
+            spent_wharf=bool(spent_wharf),
+            role=uncode(role, ROLES),
+            money=town_money,
+            people=town_people,
+            points=town_points,
+            tiles=tiles,
+            buildings=buildings,
+            **town_goods,
+        )
+    take((MAX_PLAYERS - num_players) * TOWN_SIZE)
+
+    queue_length = next(data)
+    actions = []
+    for _ in range(queue_length):
+        action_type, seat = take(2)
+        actions.append(ACTION_CLASSES[uncode(action_type, ACTIONS)](name=names[seat]))
+
+    board = Board(
+        towns=towns,
+        money=money,
+        people=people,
+        points=points,
+        roles=roles,
+        goods_fleet=goods_fleet,
+        market=market,
+        people_ship=people_ship,
+        unbuilt=unbuilt,
+        unsettled_quarries=unsettled_quarries,
+        exposed_tiles=tile_lists[0],
+        unsettled_tiles=tile_lists[1],
+        endgame_reason=uncode(endgame_reason, ENDGAME_REASONS),
+        **goods,
+    )
+    return Game(play_order=names, actions=actions, past_actions=[], board=board, pseudos={})
@@ -0,0 +1,51 @@
+import os
+import random
+import tempfile
+import unittest
+
+from .bots.book import BookBot, OpeningBook, build_book, position_hash
+from .bots.rufus import Rufus
+from .encoding import MAYOR_OFFSET, POLICY_INDEX, policy_action, policy_key
+from .game import Game
+
+USERNAMES = ("Aaron", "Bard", "Carl")
+
+
+class TestOpeningBook(unittest.TestCase):
+    def test_policy_action(self):
+        for index in range(MAYOR_OFFSET):
+            self.assertEqual(POLICY_INDEX[policy_key(policy_action(index, "Aa"))], index)
+
+    def test_hidden_tiles_order(self):
+        game = Game.start(USERNAMES, rng=random.Random(0))
+        shuffled = game.copy()
+        random.Random(1).shuffle(shuffled.board.unsettled_tiles)
+        self.assertEqual(position_hash(shuffled), position_hash(game))
+        shuffled.board.unsettled_tiles[0] = "quarry_tile"
+        self.assertNotEqual(position_hash(shuffled), position_hash(game))
+
+    def test_build_and_play(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.npy")
+            entries = build_book(path, games=20, plies=6, usernames=USERNAMES, min_visits=1, seed=0)
+            book = OpeningBook(path)
+            self.assertEqual(len(book), entries)
+            self.assertTrue((book.hashes[:-1] <= book.hashes[1:]).all())
+
+            # The first self-play game starts from this position
+            game = Game.start(USERNAMES, rng=random.Random(0))
+            bots = {name: BookBot(name, Rufus(name), book) for name in game.play_order}
+            for _ in range(6):
+                action = book.best(game)
+                self.assertIsNotNone(action)
+                self.assertIn(action, game.expected.possibilities(game.board))
+                game.step(bots[game.expected.name].decide(game))
+
+            while len(game.past_actions) < 60:
+                game.step(bots[game.expected.name].decide(game))
+            self.assertIsNone(book.best(game))
+            del book
+
+
+if __name__ == "__main__":
+    unittest.main()
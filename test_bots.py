@@ -1,26 +1,120 @@
-from rich import print
+import random
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from .actions import GameOver
+import numpy as np
+
+from .bots.batched import BatchedBot, BatchedInference, InferenceStopped
+from .bots.heuristics import POLICIES, Heuristic, benchmark, rollout
 from .bots.rufus import Rufus
+from .encoding import NUM_ACTIONS, indexed_possibilities, observation, observation_size, policy_key
 from .game import Game
 
 
 def manual_test_mixed(bots):
+    from rich import print
+
     usernames = list(bots.keys())
     game = Game.start(usernames)
-    while True:
-        try:
-            bot = bots[game.expected.name]
-            action = bot.decide(game)
-            print(action)
-            game.take_action(action)
-        except GameOver as reason:
-            print("GAME OVER.", reason)
-            print("Final score:")
-            scores = {town.name: town.tally_details()[0] for town in game.board.towns.values()}
-            for name, score in scores.items():
-                print("  ", name, ">", score, "points")
-            break
+    while not game.is_terminal:
+        bot = bots[game.expected.name]
+        action = bot.decide(game)
+        print(action)
+        game.step(action)
+    print("GAME OVER.", game.board.endgame_reason)
+    print("Final score:")
+    for name, (score, *_) in game.result().items():
+        print("  ", name, ">", score, "points")
+
+
+class TestBatchedBot(unittest.TestCase):
+    def test_policy_indices(self):
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        bots = {name: Rufus(name) for name in game.play_order}
+        while not game.is_terminal:
+            options = indexed_possibilities(game, cap=20)
+            self.assertTrue(all(0 <= index < NUM_ACTIONS for index in options))
+            if game.expected.type == "mayor":
+                hint = POLICIES["mayor"](game.board, game.expected, random.Random(0))
+                options = indexed_possibilities(game, cap=20, include=hint)
+                self.assertIn(hint, options.values())
+                self.assertEqual(len({policy_key(a) for a in options.values()}), len(options))
+            self.assertEqual(observation(game).shape, (observation_size(),))
+            game.step(bots[game.expected.name].decide(game))
+
+    def test_many_games_share_batches(self):
+        rng = np.random.default_rng(0)
+
+        def model(observations, masks):
+            assert observations.shape[0] == masks.shape[0]
+            return rng.random(masks.shape)
+
+        inference = BatchedInference(model, max_batch_size=4, max_wait=0.002)
+
+        def play(_):
+            game = Game.start(["Aaron", "Bard", "Carl", "Dave"])
+            bots = {name: BatchedBot(name, inference) for name in game.play_order}
+            while not game.step(bots[game.expected.name].decide(game)):
+                pass
+            return len(game.past_actions)
+
+        with ThreadPoolExecutor(4) as executor:
+            moves = sum(executor.map(play, range(4)))
+        inference.stop()
+        self.assertLess(inference.batches, moves)
+
+
+    def test_stop_fails_queued_requests(self):
+        evaluating, release = threading.Event(), threading.Event()
+
+        def model(observations, masks):
+            evaluating.set()
+            release.wait()
+            return np.zeros(masks.shape)
+
+        inference = BatchedInference(model, max_batch_size=1)
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        bot = BatchedBot(game.expected.name, inference)
+        first = inference.submit(observation(game), np.ones(NUM_ACTIONS))
+        evaluating.wait()
+        with ThreadPoolExecutor(2) as executor:
+            waiting = executor.submit(bot.decide, game)  # Queued behind the first request
+            while inference.requests.empty():
+                time.sleep(0.001)
+            stopping = executor.submit(inference.stop)
+            inference.stopped.wait()
+            release.set()
+            stopping.result()
+            with self.assertRaises(InferenceStopped):
+                waiting.result(timeout=5)
+        self.assertEqual(first.result(timeout=0).shape, (NUM_ACTIONS,))
+
+        # Submitting again starts a new worker
+        release.set()
+        self.assertIsInstance(bot.decide(game), type(game.expected))
+        inference.stop()
+
+
+class TestHeuristics(unittest.TestCase):
+    def test_rollout(self):
+        game = rollout(Game.start(["Aaron", "Bard", "Carl"]))
+        self.assertTrue(game.is_terminal)
+
+    def test_decisions_are_possible(self):
+        game = Game.start(["Aaron", "Bard", "Carl", "Dave"])
+        bots = {name: Heuristic(name) for name in game.play_order}
+        while not game.is_terminal:
+            action = bots[game.expected.name].decide(game)
+            if action.type != "mayor":
+                self.assertIn(action, game.expected.possibilities(game.board))
+            game.step(action)
+
+    def test_beats_rufus(self):
+        stats = benchmark(games=10, matches=100)
+        self.assertGreater(stats["playouts_per_second"], 0)
+        self.assertGreaterEqual(stats["win_rate"] - stats["win_rate_margin"], 0.25)
 
 
 if __name__ == "__main__":
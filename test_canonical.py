@@ -0,0 +1,52 @@
+import random
+import unittest
+from copy import deepcopy
+
+from attr import evolve
+
+from .bots.rufus import Rufus
+from .canonical import canonical_game, canonical_hash, canonical_key, seats, to_canonical, to_original
+from .game import Game
+
+
+def rotated(game: Game, shift: int) -> Game:
+    """The same game, with the towns listed from another seat."""
+    game = deepcopy(game)
+    names = list(game.board.towns)
+    names = names[shift:] + names[:shift]
+    game.board.towns = {name: game.board.towns[name] for name in names}
+    game.play_order = names
+    return game
+
+
+class TestCanonical(unittest.TestCase):
+    def test_rotation_invariance(self):
+        rng = random.Random(0)
+        game = Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=rng)
+        bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+        for _ in range(60):
+            key = canonical_key(game)
+            self.assertEqual(canonical_key(rotated(game, 1)), key)
+            self.assertEqual(canonical_key(canonical_game(game)), key)
+
+            action = bots[game.expected.name].decide(game)
+            order = seats(game)
+            self.assertEqual(to_original(to_canonical(action, order), order), action)
+
+            projected = canonical_game(game)
+            projected.take_action(to_canonical(action, order))
+            game.take_action(action)
+            self.assertEqual(canonical_hash(projected), canonical_hash(game))
+
+    def test_acting_player_comes_first(self):
+        game = Game.start(["Aaron", "Bard", "Carl"], shuffle=False)
+        game.take_action(game.expected)
+        game.take_action(game.expected.possibilities(game.board)[0])
+        canonical = canonical_game(game)
+        self.assertEqual(canonical.expected.name, "P0")
+        self.assertEqual(list(canonical.board.towns), ["P0", "P1", "P2"])
+        self.assertEqual(canonical.board["P0"], evolve(game.board[game.expected.name], name="P0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import random
+import unittest
+
+from .bots.rufus import Rufus
+from .diffs import COUNTERS, DiffStream, apply_diff
+from .game import Game, converters
+
+
+class TestDiffs(unittest.TestCase):
+    def test_journal(self):
+        game = Game.start(["Aaron", "Bard", "Carl"], shuffle=False)
+        stream = DiffStream(game)
+        stream.step(game.expected.possibilities(game.board)[0])  # Governor
+        role = next(a for a in game.expected.possibilities(game.board) if a.role == "settler")
+        diff = stream.step(role)
+        name = role.name
+        self.assertEqual(stream.journal.changes[("roles",)], {"settler"})
+        self.assertIn("role", stream.journal.changes[("towns", name)])
+        self.assertEqual(set(diff["board"]), {"roles", "towns"})
+        self.assertEqual(set(diff["board"]["towns"]), {name})
+        self.assertIsNone(game.copy().board.journal)
+        self.assertIsNone(game.copy().board.towns[name].tiles.journal)
+        stream.close()
+        self.assertIsNone(game.board.journal)
+        self.assertIsNone(game.board.towns[name].buildings.journal)
+
+    def test_queue_diff(self):
+        game = Game.start(["Aaron", "Bard", "Carl"], shuffle=False)
+        stream = DiffStream(game)
+        queue = list(game.actions)
+        diff = stream.step(queue[0])
+        self.assertEqual(diff["queue"]["drop"], 1)
+        expected = [a for a in game.actions if a not in queue[1:]]
+        indexes = [index for index, _ in diff["queue"]["insert"]]
+        self.assertEqual([game.actions[i] for i in indexes], expected)
+
+    def test_client_follows_game(self):
+        converter = converters().game_converter
+        rng = random.Random(0)
+        game = Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=rng)
+        client = Game.loads(game.dumps())
+        board, towns = client.board, dict(client.board.towns)
+        stream = DiffStream(game, check=True)
+        bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+        while not game.is_terminal:
+            diff = stream.step(bots[game.expected.name].decide(game))
+            self.assertLess(len(json.dumps(diff)), len(game.dumps()) // 4)
+            apply_diff(client, json.loads(json.dumps(diff)))
+        self.assertEqual(converter.unstructure(client), converter.unstructure(game))
+        for counter in COUNTERS:
+            self.assertEqual(getattr(client.board, counter), getattr(game.board, counter))
+        # Patched in place
+        self.assertIs(client.board, board)
+        self.assertTrue(all(client.board.towns[name] is town for name, town in towns.items()))
+        self.assertIsNone(stream.step(game.past_actions[-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
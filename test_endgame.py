@@ -0,0 +1,90 @@
+import random
+import unittest
+
+from .bots.endgame import LOWER, EndgameBot, EndgameSolver, outcome
+from .bots.rufus import Rufus
+from .game import Game
+
+
+def late_position(seed: int, pending: int = 2) -> Game:
+    """A position after the endgame was triggered, with few moves before game over."""
+    rng = random.Random(seed)
+    game = Game.start(["Aaron", "Bard", "Carl"], rng=rng)
+    bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+    while not game.is_terminal and not (game.board.endgame_reason and len(game.actions) <= pending):
+        game.step(bots[game.expected.name].decide(game))
+    return game
+
+
+def minimax(game: Game, root: str) -> int:
+    """Plain paranoid minimax, without pruning nor transpositions."""
+    if game.is_terminal:
+        values = outcome(game)
+        return values[root] - max(v for name, v in values.items() if name != root)
+    values = []
+    for move in EndgameSolver().moves(game, None):
+        child = game.copy()
+        child.take_action(move)
+        values.append(minimax(child, root))
+    return max(values) if game.expected.name == root else min(values)
+
+
+def outcome_of(result: dict[str, tuple[int, ...]]) -> dict[str, int]:
+    return {name: 1000 * tally[0] + tally[-1] for name, tally in result.items()}
+
+
+class TestEndgameSolver(unittest.TestCase):
+    def test_matches_minimax(self):
+        solved = 0
+        for seed in range(5):
+            game = late_position(seed)
+            if game.is_terminal:
+                continue
+            solver = EndgameSolver(max_nodes=1000)
+            solution = solver.solve(game)
+            if solution is None:
+                continue
+            solved += 1
+            self.assertEqual(solution.value, minimax(game, game.expected.name))
+            # The line of the result is the best line
+            root, values = game.expected.name, outcome_of(solution.result)
+            self.assertEqual(solution.value, values[root] - max(v for n, v in values.items() if n != root))
+            self.assertIn(solution.action, solver.moves(game, None))
+            self.assertEqual(set(solution.result), set(game.board.towns))
+            self.assertGreater(solver.stats()["nodes_per_second"], 0)
+        self.assertGreater(solved, 0)
+
+    def test_maxn_result(self):
+        game = late_position(1)
+        solution = EndgameSolver(max_nodes=1000, mode="maxn").solve(game)
+        self.assertIsNotNone(solution)
+        self.assertEqual(solution.value, outcome_of(solution.result))
+
+    def test_best_move_searches_again(self):
+        game = late_position(1)
+        solver = EndgameSolver(max_nodes=1000)
+        solution = solver.solve(game)
+        self.assertIsNotNone(solution)
+        # Without entries, or with bounds only, the best move is searched again
+        solver.bounds.clear()
+        self.assertEqual(solver.best_move(game, game.expected.name), solution.action)
+        for bound in solver.bounds.values():
+            bound.flag, bound.best = LOWER, None
+        self.assertEqual(solver.best_move(game, game.expected.name), solution.action)
+
+    def test_seeded_move_ordering(self):
+        game = late_position(2)
+        first = EndgameSolver(max_nodes=1000, rng=random.Random(3)).solve(game)
+        second = EndgameSolver(max_nodes=1000, rng=random.Random(3)).solve(game)
+        self.assertEqual(first, second)
+
+    def test_bot_falls_back(self):
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        name = game.expected.name
+        bot = EndgameBot(name, Rufus(name), EndgameSolver(max_nodes=10))
+        self.assertFalse(bot.solver.is_endgame(game))
+        self.assertEqual(bot.decide(game).type, "governor")
+
+
+if __name__ == "__main__":
+    unittest.main()
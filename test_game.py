@@ -1,12 +1,23 @@
+import os
+import pickle
+import random
+import subprocess
+import sys
+import threading
 import unittest
+from copy import deepcopy
+from pathlib import Path
 
 
 from .actions import *
 from .boards import Board
-from .constants import BUILDINGS, GOODS, ROLES
-from .game import Game
+from .bots.rufus import Rufus
+from . import game as game_module
+from .constants import BUILD_INFO, BUILDINGS, GOOD_PRICES, GOODS, ROLES
+from .encoding import policy_key
+from .game import Game, converters
 from .towns import Town
-from .utils import WorkplaceData
+from .utils import ShipData, WorkplaceData, Workplaces, spawn_rngs
 
 
 class TestFixedGame4(unittest.TestCase):
@@ -71,11 +82,435 @@ class TestFixedGame4(unittest.TestCase):
         self.game.take_action(RoleAction("Aa", role="trader"))
         assert all( isinstance(action, TraderAction) for action in self.game.actions[:4] )
     
+    def test_game_over_is_terminal(self):
+        game, board = self.game, self.game.board
+        game.take_action(GovernorAction("Aa"))
+        for town in board.towns.values():
+            town.role = "prospector"
+        board.endgame_reason = "points"
+        game.actions = [GovernorAction("Ba")]
+        self.assertFalse(game.is_terminal)
+        self.assertTrue(game.step(GovernorAction("Ba")))
+        self.assertTrue(game.is_terminal)
+        self.assertTrue(game.step(GovernorAction("Ba")))
+        with self.assertRaises(GameOver):
+            game.take_action(GovernorAction("Ba"))
+
+    def test_result(self):
+        game, board = self.game, self.game.board
+        board["Ba"].points = 3
+        board["Ca"].points = 3
+        board["Ca"].corn = 1
+        result = game.result()
+        self.assertEqual(list(result), ["Ca", "Ba", "Aa", "Da"])
+        self.assertEqual(result["Ba"][:-1], board["Ba"].tally_details())
+        self.assertEqual(result["Ca"][-1], board["Ca"].money + 1)
+
+    def test_random_game_reaches_terminal_state(self):
+        game = self.game
+        bots = {name: Rufus(name) for name in game.play_order}
+        while not game.step(bots[game.expected.name].decide(game)):
+            pass
+        self.assertIsNotNone(game.board.endgame_reason)
+        self.assertEqual(len(game.result()), 4)
+
     def test_no_second_prospector(self):
         self.game.take_action(GovernorAction("Aa"))
         with self.assertRaises(AssertionError):
             self.game.take_action(RoleAction("Aa", role="second_prospector"))
 
+def seeded_game(seed) -> Game:
+    game_rng, bots_rng = spawn_rngs(seed, 2)
+    game = Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=game_rng)
+    bots = {name: Rufus(name, rng=bots_rng) for name in game.play_order}
+    while not game.step(bots[game.expected.name].decide(game)):
+        pass
+    return game
+
+
+def seeded_game_start(seed) -> Game:
+    return Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=spawn_rngs(seed, 1)[0])
+
+
+class TestSeeds(unittest.TestCase):
+    def test_same_seed_same_game(self):
+        self.assertEqual(seeded_game(7).dumps(), seeded_game(7).dumps())
+        self.assertNotEqual(seeded_game(7).dumps(), seeded_game(8).dumps())
+
+    def test_independent_of_hash_seed(self):
+        package = Path(__file__).parent
+        code = f"from {package.name}.test_game import seeded_game; print(seeded_game(7).dumps())"
+        outputs = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=package.parent,
+                env={**os.environ, "PYTHONHASHSEED": hash_seed},
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            for hash_seed in ("1", "2")
+        }
+        self.assertEqual(len(outputs), 1)
+
+    def test_start_many(self):
+        for usernames in (["Aaron", "Bard", "Carl"], ["Aaron", "Bard", "Carl", "Dave", "Eve"]):
+            seeds = range(20)
+            games = Game.start_many(len(seeds), usernames, seeds)
+            for seed, game in zip(seeds, games):
+                expected = Game.start(usernames, rng=random.Random(seed))
+                self.assertEqual(game.dumps(), expected.dumps())
+            self.assertEqual(Game.start_many(2, usernames, shuffle=False)[1], Game.start(usernames, shuffle=False))
+
+        # Games and the template don't share anything that they change
+        first, second = games[:2]
+        first.step(first.expected)
+        first.board.towns[first.play_order[0]].tiles["corn_tile"] = WorkplaceData(3, 3)
+        self.assertEqual(second.dumps(), Game.start(usernames, rng=random.Random(1)).dumps())
+        self.assertEqual(Game.start_many(1, usernames, [0])[0].dumps(), Game.start(usernames, rng=random.Random(0)).dumps())
+
+    def test_spawn_rngs(self):
+        first, second = spawn_rngs(0, 2)
+        self.assertNotEqual(first.random(), second.random())
+        self.assertEqual(spawn_rngs(0, 3)[1].random(), spawn_rngs(0, 2)[1].random())
+
+
+def mayor_board() -> Board:
+    """A board where Aa has four people for many jobs."""
+    board = Board.new(["Aa", "Ba", "Ca"], shuffle_tiles=False)
+    town = board["Aa"]
+    town.tiles["indigo_tile"] = WorkplaceData(2, 0)
+    town.tiles["corn_tile"] = WorkplaceData(1, 0)
+    town.tiles["quarry_tile"] = WorkplaceData(1, 0)
+    town.buildings["small_indigo_plant"] = WorkplaceData(1, 0)
+    town.buildings["sugar_mill"] = WorkplaceData(1, 0)
+    town.buildings["hacienda"] = WorkplaceData(1, 0)
+    town.people = 4
+    return board
+
+
+class TestMayorPruning(unittest.TestCase):
+    def setUp(self):
+        self.board = mayor_board()
+
+    def test_pruned_distributions_are_not_dominated(self):
+        mayor = MayorAction("Aa")
+        town = self.board["Aa"]
+        full = mayor.possibilities(self.board)
+        pruned = mayor.possibilities(self.board, prune=True)
+        self.assertLess(len(pruned), len(full))
+        self.assertEqual(mayor.reduction(self.board), (len(pruned), len(full)))
+        kept = [action.features(town) for action in pruned]
+        for action in full:
+            features = action.features(town)
+            self.assertTrue(
+                any(all(k >= f for k, f in zip(other, features)) for other in kept)
+            )
+
+    def test_pruned_distribution_can_be_played(self):
+        for action in MayorAction("Aa").possibilities(self.board, prune=True):
+            board = deepcopy(self.board)
+            action.react(board)
+            self.assertEqual(board["Aa"].count_total_people(), 4)
+
+
+class TestMayorReact(unittest.TestCase):
+    def setUp(self):
+        self.board = mayor_board()
+        self.town = self.board["Aa"]
+        self.pairs = MayorAction("Aa").possibilities(self.board)[0].people_distribution
+
+    def test_one_distribution_form(self):
+        vector = [amount for _, amount in self.pairs]
+        lists = [list(pair) for pair in self.pairs]
+        for action in (
+            MayorAction.from_vector(self.town, vector),
+            MayorAction("Aa", people_distribution=lists),
+            converters().game_converter.structure({"type": "mayor", "name": "Aa", "people_distribution": lists}, Action),
+        ):
+            self.assertEqual(action.people_distribution, self.pairs)
+            self.assertEqual(policy_key(action), policy_key(MayorAction("Aa", people_distribution=self.pairs)))
+        with self.assertRaises(ValueError):
+            MayorAction.from_vector(self.town, vector[1:])
+        with self.assertRaises(TypeError):
+            MayorAction("Aa", people_distribution=vector)
+
+        board = deepcopy(self.board)
+        MayorAction("Aa", people_distribution=self.pairs).react(self.board)
+        MayorAction.from_vector(board["Aa"], vector).react(board)
+        self.assertEqual(board, self.board)
+        self.assertEqual(board.vacant_building_jobs, self.board.vacant_building_jobs)
+
+    def test_wrong_distributions(self):
+        holders = MayorAction("Aa").holders(self.town)
+        for distribution in (
+            [4] + [0] * (len(holders) - 1),  # Too short
+            [5] + [0] * len(holders),  # Too many people
+            [0] + [4] + [0] * (len(holders) - 1),  # More people than jobs
+            [5, -1] + [0] * (len(holders) - 1),
+        ):
+            with self.assertRaises(AssertionError):
+                pairs = list(zip(["home", *holders], distribution))
+                MayorAction("Aa", people_distribution=pairs).react(deepcopy(self.board))
+
+
+class TestBoardCounters(unittest.TestCase):
+    def test_counters_match_recomputation(self):
+        for seed in range(10):
+            game_rng, bots_rng = spawn_rngs(seed, 2)
+            game = Game.start(["Aaron", "Bard", "Carl", "Dave", "Earl"][: 3 + seed % 3], rng=game_rng)
+            bots = {name: Rufus(name, rng=bots_rng) for name in game.play_order}
+            while not game.step(bots[game.expected.name].decide(game)):
+                board, towns = game.board, game.board.towns.values()
+                self.assertEqual(
+                    board.vacant_building_jobs,
+                    sum(town.count_vacant_building_jobs() for town in towns),
+                )
+                self.assertEqual(
+                    board.is_end_of_round(), all(town.role is not None for town in towns)
+                )
+                self.assertEqual(
+                    board.min_free_build_space,
+                    min(town.count_free_build_space() for town in towns),
+                )
+
+
+    def test_direct_edits(self):
+        board = Board.new(["Aa", "Ba", "Ca"])
+        town = board["Aa"]
+        self.assertEqual((board.vacant_building_jobs, board.min_free_build_space), (0, 12))
+        town.buildings["factory"] = WorkplaceData(1, 0)
+        town.buildings["hospice"] = WorkplaceData(1, 1)
+        self.assertEqual((board.vacant_building_jobs, board.min_free_build_space), (1, 10))
+        town.buildings = {b: WorkplaceData(0, 0) for b in BUILDINGS}
+        self.assertEqual((board.vacant_building_jobs, board.min_free_build_space), (0, 12))
+        town.role = "mayor"
+        self.assertEqual(board.towns_with_role, 1)
+
+        # Copies count on their own, removals and unpickled boards count again
+        town.buildings["coffee_roaster"] = WorkplaceData(1, 0)
+        copied = board.copy()
+        copied["Ba"].buildings["city_hall"] = WorkplaceData(1, 0)
+        copied.reset_roles()
+        self.assertEqual((copied.vacant_building_jobs, copied.min_free_build_space), (3, 10))
+        self.assertEqual((board.vacant_building_jobs, board.min_free_build_space), (2, 11))
+        self.assertEqual((copied.towns_with_role, board.towns_with_role), (0, 1))
+        town.buildings.pop("coffee_roaster")
+        self.assertEqual((board.vacant_building_jobs, board.min_free_build_space), (0, 12))
+        unpickled = pickle.loads(pickle.dumps(copied))
+        self.assertEqual((unpickled.vacant_building_jobs, unpickled.min_free_build_space), (3, 10))
+        unpickled["Ba"].buildings["city_hall"] = WorkplaceData(1, 1)
+        self.assertEqual(unpickled.vacant_building_jobs, 2)
+
+
+class TestImport(unittest.TestCase):
+    # Cumulative import time of the package, at most this many times that of
+    # asyncio imported in the same process (about 1 without cattrs, 2 with it)
+    budget_ratio = 2
+
+    def test_import_time(self):
+        package = Path(__file__).parent
+        code = f"import sys, asyncio, {package.name}; print('cattrs' in sys.modules, 'rich' in sys.modules)"
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=package.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(process.stdout.split(), ["False", "False"])
+        cumulative = {
+            line.split("|")[-1].strip(): int(line.split("|")[1])
+            for line in process.stderr.splitlines()[1:]
+        }
+        self.assertLess(cumulative[package.name], self.budget_ratio * cumulative["asyncio"])
+
+
+class TestValidate(unittest.TestCase):
+    def test_possibilities_are_valid(self):
+        rng = random.Random(0)
+        game = seeded_game_start(0)
+        bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+        while not game.is_terminal:
+            keys = game.legal_keys()
+            self.assertIs(game.legal_keys(), keys)
+            action = bots[game.expected.name].decide(game)
+            game.validate(action)
+            game.step(action)
+        with self.assertRaises(GameOver):
+            game.validate(action)
+
+    def test_illegal_actions(self):
+        game = seeded_game_start(0)
+        name = game.expected.name
+        game.take_action(GovernorAction(name))
+        game.validate(RoleAction(name, role="mayor"))
+        for action in (
+            RoleAction("Xx", role="mayor"),
+            GovernorAction(name),
+            RoleAction(name, role="second_prospector"),
+            RoleAction(name, role="gold"),  # type: ignore
+            RoleAction(name, role=["mayor"]),  # type: ignore
+            "mayor",
+        ):
+            with self.assertRaises(IllegalAction):
+                game.validate(action)  # type: ignore
+        game.take_action(RoleAction(name, role="mayor"))
+        mayor = game.expected
+        distribution = mayor.possibilities(game.board)[0].people_distribution
+        game.validate(MayorAction(mayor.name, people_distribution=[list(pair) for pair in distribution]))
+        town = game.board.towns[mayor.name]
+        game.validate(MayorAction.from_vector(town, [amount for _, amount in distribution]))
+        with self.assertRaises(IllegalAction):
+            game.validate(MayorAction(mayor.name, people_distribution=[("home", 99)]))
+
+    def test_mayor_checks_match_possibilities(self):
+        rng = random.Random(0)
+        checked = 0
+        for seed in range(4):
+            game = seeded_game_start(seed)
+            bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+            while not game.is_terminal:
+                expected = game.expected
+                if isinstance(expected, MayorAction):
+                    keys = game.legal_keys()
+                    town = game.board.towns[expected.name]
+                    vector = [amount for _, amount in rng.choice(expected.possibilities(game.board)).people_distribution]
+                    for i, j in ((i, j) for i in range(len(vector)) for j in range(len(vector))):
+                        moved = vector[:]
+                        moved[i], moved[j] = moved[i] - 1, moved[j] + 1
+                        action = MayorAction.from_vector(town, moved)
+                        try:
+                            game.validate(action)
+                            legal = True
+                        except IllegalAction:
+                            legal = False
+                        self.assertEqual(legal, action.key() in keys, action)
+                        checked += 1
+                game.step(bots[expected.name].decide(game))
+        self.assertGreater(checked, 100)
+
+    def test_without_asserts(self):
+        package = Path(__file__).parent
+        code = (
+            f"from {package.name}.test_game import *; game = seeded_game_start(0); "
+            "game.validate(RoleAction(game.expected.name, role='mayor'))"
+        )
+        process = subprocess.run(
+            [sys.executable, "-O", "-c", code], cwd=package.parent, capture_output=True, text=True
+        )
+        self.assertIn("IllegalAction", process.stderr)
+
+
+def trusted_differential(games: int, seed: int = 0) -> int:
+    """Play every move of random games both checked and trusted, and compare the games."""
+    from .bots.heuristics import POLICIES
+
+    moves = 0
+    for game_seed in range(seed, seed + games):
+        rng = random.Random(game_seed)
+        checked = seeded_game_start(game_seed)
+        trusted = checked.copy()
+        while not checked.is_terminal:
+            expected = checked.expected
+            if rng.random() < 0.5:
+                action = POLICIES[expected.type](checked.board, expected, rng)
+            else:
+                action = rng.choice(expected.possibilities(checked.board, cap=20, rng=rng))
+            checked.take_action(action)
+            trusted.take_action(action, trusted=True)
+            assert trusted == checked and (
+                trusted.board.vacant_building_jobs == checked.board.vacant_building_jobs
+            ), f"Trusted {action} diverged in game {game_seed}."
+            moves += 1
+    return moves
+
+
+class TestTrusted(unittest.TestCase):
+    def test_same_games_as_checked(self):
+        self.assertGreater(trusted_differential(games=10), 1000)
+
+
+class TestThreads(unittest.TestCase):
+    def test_shared_tables_are_read_only(self):
+        with self.assertRaises(TypeError):
+            GOOD_PRICES["corn"] = 5  # type: ignore
+        with self.assertRaises(TypeError):
+            BUILD_INFO["wharf"]["cost"] = 0  # type: ignore
+
+    def test_converters_are_built_once(self):
+        game_module._converters = None
+        built = []
+        threads = [threading.Thread(target=lambda: built.append(game_module.converters())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(converters is built[0] for converters in built))
+        self.assertIs(game_module.game_converter, built[0].game_converter)
+
+    def test_copies_do_not_share_the_lock(self):
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        for clone in (game.copy(), deepcopy(game), pickle.loads(pickle.dumps(game))):
+            self.assertEqual(clone, game)
+            self.assertIsNot(clone.lock, game.lock)
+        self.assertNotIn("lock", game.dumps())
+
+    def test_copies_do_not_share_roles(self):
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        games = Game.start_many(2, ["Aaron", "Bard", "Carl"], [1, 2])
+        for clone in (game.copy(), deepcopy(game), games[0]):
+            with self.assertRaises(AttributeError):
+                clone.board.roles["mayor"].money = 7  # type: ignore
+            clone.board.reset_roles()
+            town = clone.board.towns[clone.play_order[0]]
+            clone.board.give_role("builder", to=town)
+        self.assertEqual(game.board.roles["mayor"].money, 0)
+        self.assertTrue(game.board.roles["builder"].available)
+        self.assertEqual(games[1].board.roles["mayor"].money, 0)
+        self.assertTrue(Game.start_many(1, ["Aaron", "Bard", "Carl"], [3])[0].board.roles["builder"].available)
+
+    def test_deepcopy_keeps_shared_references(self):
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        town = next(iter(game.board.towns.values()))
+        board, copied_town, copied_game = deepcopy([game.board, town, game])
+        self.assertIs(copied_town, board.towns[town.name])
+        self.assertIsNot(copied_town, town)
+        self.assertIsNot(copied_game.board, game.board)
+        self.assertEqual(copied_game, game)
+
+    def test_stress(self):
+        """Many threads play moves of many games, in any order."""
+        games = [seeded_game_start(seed) for seed in range(12)]
+        starts = [game.copy() for game in games]
+        errors = []
+
+        def play(seed: int):
+            rng = random.Random(seed)
+            try:
+                while not all(game.is_terminal for game in games):
+                    game = rng.choice(games)
+                    with game.lock:
+                        if not game.is_terminal:
+                            game.step(Rufus(game.expected.name, rng=rng).decide(game))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=play, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        # Replaying the moves in a single thread leads to the same games
+        for game, replay in zip(games, starts):
+            for action in game.past_actions:
+                replay.take_action(action)
+            self.assertTrue(replay.is_terminal)
+            self.assertEqual(replay.dumps(), game.dumps())
+
+
 class TestBoard3(unittest.TestCase):
 
     def setUp(self):
@@ -97,6 +532,39 @@ class TestBoard3(unittest.TestCase):
         self.board.give_tile(tile, to=town)
         self.assertEqual(town.tiles[tile].placed, prev+1)
 
+    def test_market(self):
+        for good in ("sugar", "corn", "sugar"):
+            self.board.market.append(good)
+        self.assertEqual(self.board.market, ["corn", "sugar", "sugar"])
+        self.assertEqual(self.board.market.count("sugar"), 2)
+        self.assertNotIn("coffee", self.board.market)
+
+        corn, sugar = self.board.corn, self.board.sugar
+        self.board.empty_ships_and_market()
+        self.assertEqual(len(self.board.market), 3)
+        self.board.market.append("coffee")
+        self.board.empty_ships_and_market()
+        self.assertEqual(list(self.board.market), [])
+        self.assertEqual((self.board.corn, self.board.sugar), (corn + 1, sugar + 2))
+
+    def test_fleet(self):
+        board = self.board
+        board.load_cargo(4, "corn", 4)
+        board.load_cargo(2, "indigo", 5)
+        self.assertFalse(board.ship_accept(4, "corn"))
+        self.assertFalse(board.ship_accept(6, "indigo"))
+        self.assertTrue(board.ship_accept(5, "indigo"))
+        self.assertTrue(board.ship_accept(6, "sugar"))
+        self.assertEqual(board.goods_fleet[5], ShipData(5, "indigo", 2))
+
+        corn = board.corn
+        board.empty_ships_and_market()
+        self.assertEqual(dict(board.goods_fleet.items()), {
+            4: ShipData(4, None, 0), 5: ShipData(5, "indigo", 2), 6: ShipData(6, None, 0),
+        })
+        self.assertEqual(board.corn, corn + 4)
+        self.assertTrue(board.ship_accept(4, "corn"))
+
 class TestTown(unittest.TestCase):
 
     def setUp(self):
@@ -154,6 +622,52 @@ class TestTown(unittest.TestCase):
         self.town.buildings["indigo_plant"] = WorkplaceData(1, 1)
         self.assertEqual(self.town.production("indigo"), 3)
 
+    def test_production_cache(self):
+        self.town.tiles["sugar_tile"] = WorkplaceData(2, 2)
+        self.town.buildings["sugar_mill"] = WorkplaceData(1, 1)
+        self.assertEqual(self.town.production_vector(), (0, 0, 0, 1, 0))
+        self.assertIs(self.town.production_vector(), self.town.production_vector())
+
+        copied = deepcopy(self.town)
+        copied.buildings["sugar_mill"] = WorkplaceData(1, 2)
+        self.assertEqual(copied.production("sugar"), 2)
+        self.assertEqual(self.town.production("sugar"), 1)
+
+        # Replaced dicts are stamped too
+        self.town.tiles = {tile: WorkplaceData(1, 1) for tile in TILES}
+        self.assertEqual(self.town.production(), dict(zip(GOODS, (0, 1, 0, 1, 0))))
+
+    def test_workplaces_stamps(self):
+        tiles = self.town.tiles
+        with self.assertRaises(AttributeError):
+            tiles["corn_tile"].worked = 1  # type: ignore
+        for change in (
+            lambda: tiles.pop("corn_tile"),
+            lambda: tiles.setdefault("corn_tile", WorkplaceData(1, 1)),
+            lambda: tiles.popitem(),
+            lambda: tiles.__delitem__("coffee_tile"),
+            lambda: tiles.__ior__({"sugar_tile": WorkplaceData(1, 0)}),
+            lambda: tiles.clear(),
+        ):
+            stamp = tiles.stamp
+            change()
+            self.assertGreater(tiles.stamp, stamp)
+        tiles.setdefault("corn_tile", WorkplaceData(2, 2))
+        stamp = tiles.stamp
+        tiles.setdefault("corn_tile", WorkplaceData(3, 3))  # Already there: no change
+        self.assertEqual((tiles.stamp, tiles["corn_tile"]), (stamp, WorkplaceData(2, 2)))
+
+        stamps = []
+        def take():
+            for _ in range(1000):
+                stamps.append(Workplaces().stamp)
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(stamps)), len(stamps))
+
 class TestConstants(unittest.TestCase):
 
     def test_buildings(self):
@@ -0,0 +1,69 @@
+import pickle
+import random
+import unittest
+from copy import deepcopy
+
+from .actions import GovernorAction, MayorAction, RoleAction
+from .bots.rufus import Rufus
+from .game import Game
+from .history import History
+
+
+def played_game(seed: int) -> tuple[Game, list]:
+    rng = random.Random(seed)
+    game = Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=rng)
+    bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+    actions = []
+    while not game.is_terminal:
+        action = bots[game.expected.name].decide(game)
+        actions.append(action)
+        game.step(action)
+    return game, actions
+
+
+class TestHistory(unittest.TestCase):
+    def test_actions_round_trip(self):
+        game, actions = played_game(0)
+        self.assertTrue(any(isinstance(action, MayorAction) for action in actions))
+        self.assertEqual(list(game.past_actions), actions)
+        self.assertEqual(game.past_actions, actions)
+        self.assertEqual(game.past_actions[-1], actions[-1])
+        self.assertEqual(game.past_actions[3:6], actions[3:6])
+        self.assertEqual(pickle.loads(pickle.dumps(game.past_actions)), actions)
+        self.assertEqual(Game.loads(game.dumps()).past_actions, game.past_actions)
+
+    def test_mayor_distributions(self):
+        actions = [
+            MayorAction("Aa", people_distribution=[["home", 1], ["corn_tile", 2]]),
+            MayorAction("Aa", people_distribution=[]),
+            MayorAction("Aa"),
+        ]
+        self.assertEqual(History(actions), actions)
+        self.assertEqual(History(actions)[0].people_distribution, [("home", 1), ("corn_tile", 2)])
+
+    def test_copies_share_up_to_branch_point(self):
+        history = History([GovernorAction("Aa")])
+        first, second = history.copy(), deepcopy(history)
+        self.assertIs(first.log, history.log)
+
+        first.append(RoleAction("Aa", role="mayor"))
+        second.append(RoleAction("Aa", role="builder"))
+        history.append(RoleAction("Aa", role="trader"))
+        self.assertIsNot(second.log, first.log)
+        self.assertEqual([action.role for action in first[1:]], ["mayor"])
+        self.assertEqual([action.role for action in second[1:]], ["builder"])
+        self.assertEqual([action.role for action in history[1:]], ["trader"])
+        self.assertEqual(len(history.log.codes), len(first.log.codes))
+
+    def test_game_copies(self):
+        game, _ = played_game(1)
+        game.actions = [GovernorAction(game.play_order[0])]  # Pretend the game goes on
+        clone = game.copy()
+        self.assertIs(clone.past_actions.log, game.past_actions.log)
+        clone.take_action(clone.expected)
+        self.assertEqual(len(clone.past_actions), len(game.past_actions) + 1)
+        self.assertEqual(clone.past_actions[:-1], game.past_actions)
+
+
+if __name__ == "__main__":
+    unittest.main()
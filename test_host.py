@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from .bots.rufus import Rufus
+from .diffs import apply_diff
+from .game import Game, converters, game_converter
+from .host import GameHost
+
+
+class TestGameHost(unittest.TestCase):
+    def test_many_bot_tables(self):
+        async def run():
+            host = GameHost()
+            for i in range(20):
+                usernames = ["Aaron", "Bard", "Carl", "Dave"]
+                game = host.open_table(f"t{i}", usernames)
+                host.tables[f"t{i}"].bots = {name: Rufus(name) for name in game.play_order}
+            return host, await host.play_all()
+
+        host, games = asyncio.run(run())
+        self.assertEqual(len(games), 20)
+        self.assertTrue(all(game.is_terminal for game in games.values()))
+        self.assertEqual(host.metrics.moves, sum(len(g.past_actions) for g in games.values()))
+        self.assertGreater(host.metrics.moves_per_second(), 0)
+        self.assertGreaterEqual(host.metrics.p99_latency(), host.metrics.p99_engine_time())
+        self.assertGreater(host.metrics.p99_engine_time(), 0)
+
+    def test_diffs(self):
+        async def run():
+            host = GameHost()
+            game = host.open_table("t", ["Aaron", "Bard", "Carl"])
+            client = Game.loads(game.dumps())
+            host.tables["t"].bots = {name: Rufus(name) for name in game.play_order}
+            await host.play("t")
+            first = await host.handle({"op": "diffs", "table": "t"})
+            rest = await host.handle({"op": "diffs", "table": "t", "since": 10})
+            return game, client, first, rest
+
+        game, client, first, rest = asyncio.run(run())
+        self.assertEqual(first["moves"], len(game.past_actions))
+        self.assertEqual(first["diffs"][10:], rest["diffs"])
+        for diff in json.loads(json.dumps(first["diffs"])):
+            apply_diff(client, diff)
+        converter = converters().game_converter
+        self.assertEqual(converter.unstructure(client), converter.unstructure(game))
+
+    def test_diffs_are_capped(self):
+        async def run():
+            host = GameHost(max_diffs=10)
+            game = host.open_table("t", ["Aaron", "Bard", "Carl"])
+            host.tables["t"].bots = {name: Rufus(name) for name in game.play_order}
+            await host.play("t")
+            moves = len(game.past_actions)
+            old = await host.handle({"op": "diffs", "table": "t"})
+            last = await host.handle({"op": "diffs", "table": "t", "since": moves - 4})
+            return host, moves, old, last
+
+        host, moves, old, last = asyncio.run(run())
+        self.assertEqual(len(host.tables["t"].diffs), 10)
+        self.assertFalse(old["ok"])
+        self.assertEqual(len(last["diffs"]), 4)
+        self.assertEqual(last["moves"], moves)
+        game = host.close_table("t")
+        self.assertIsNone(game.board.journal)
+
+    def test_timeout_plays_first_possibility(self):
+        async def run():
+            host = GameHost(timeout=0.01)
+            host.open_table("t", ["Aaron", "Bard", "Carl"], shuffle=False)
+            task = asyncio.create_task(host.play("t"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            return host.tables["t"].game
+
+        game = asyncio.run(run())
+        self.assertGreater(len(game.past_actions), 1)
+
+    def test_slow_bots_decide_on_copies(self):
+        seen = []
+
+        class SlowBot:
+            def __init__(self, name):
+                self.name = name
+
+            def decide(self, game):
+                seen.append(game)
+                time.sleep(0.05)
+                raise RuntimeError("Too late anyway")
+
+        async def run():
+            host = GameHost(timeout=0.01)
+            game = host.open_table("t", ["Aaron", "Bard", "Carl"], shuffle=False)
+            host.tables["t"].bots = {name: SlowBot(name) for name in game.play_order}
+            task = asyncio.create_task(host.play("t"))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            return game
+
+        game = asyncio.run(run())
+        self.assertGreater(len(game.past_actions), 1)
+        self.assertTrue(seen)
+        self.assertTrue(all(position is not game for position in seen))
+
+    def test_unix_socket_client(self):
+        async def client(path: str, bot: Rufus):
+            reader, writer = await asyncio.open_unix_connection(path)
+
+            async def ask(request):
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                return json.loads(await reader.readline())
+
+            moves = 0
+            while moves < 5:
+                response = await ask({"op": "state", "table": "t"})
+                game = Game.loads(response["state"])
+                if response["waiting"] and game.expected.name == bot.name:
+                    action = game_converter.unstructure(bot.decide(game))
+                    response = await ask({"op": "move", "table": "t", "action": action})
+                    self.assertTrue(response["ok"], response)
+                    moves += 1
+                else:
+                    await asyncio.sleep(0)
+            self.assertFalse((await ask({"op": "state", "table": "nope"}))["ok"])
+            writer.close()
+
+        async def run(path: str):
+            host = GameHost()
+            game = host.open_table("t", ["Aaron", "Bard", "Carl"], shuffle=False)
+            host.tables["t"].bots = {name: Rufus(name) for name in game.play_order[1:]}
+            server = await host.serve_unix(path)
+            task = asyncio.create_task(host.play("t"))
+            await client(path, Rufus(game.play_order[0]))
+            task.cancel()
+            server.close()
+            return host
+
+        with tempfile.TemporaryDirectory() as tmp:
+            host = asyncio.run(run(os.path.join(tmp, "host.sock")))
+        self.assertGreaterEqual(host.metrics.moves, 5)
+
+    def test_malformed_requests(self):
+        lines = [
+            b"not json",
+            b"\xff\xfe",
+            b"[1, 2]",
+            b'"state"',
+            b'{"op": "state", "table": ["t"]}',
+            b'{"op": "diffs", "table": "t", "since": "a"}',
+            b'{"op": "diffs", "table": "t", "since": -1}',
+            b'{"op": "move", "table": "t"}',
+            b'{"op": "move", "table": "t", "action": [1]}',
+            b'{"op": "move", "table": "t", "action": {"type": "governor"}}',
+            b'{"op": "move", "table": "t", "action": {"type": "nope", "name": "Aa"}}',
+            b'{"op": "move", "table": "t", "action": {"type": "role", "name": "Aa", "role": 3}}',
+            b'{"op": "move", "table": "t", "action": {"type": "governor", "name": "Aa"}}',  # Not waiting
+            b'{"op": "nope", "table": "t"}',
+        ]
+
+        async def run(path: str):
+            host = GameHost()
+            host.open_table("t", ["Aaron", "Bard", "Carl"], shuffle=False)
+            server = await host.serve_unix(path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            responses = []
+            for line in lines:
+                writer.write(line + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            # The connection still answers
+            writer.write(json.dumps({"op": "diffs", "table": "t"}).encode() + b"\n")
+            await writer.drain()
+            last = json.loads(await reader.readline())
+            writer.close()
+            server.close()
+            return responses, last
+
+        with tempfile.TemporaryDirectory() as tmp:
+            responses, last = asyncio.run(run(os.path.join(tmp, "host.sock")))
+        for line, response in zip(lines, responses):
+            self.assertFalse(response["ok"], line)
+            self.assertIn("error", response)
+        self.assertTrue(last["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
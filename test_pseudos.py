@@ -0,0 +1,43 @@
+import random
+import unittest
+
+from .pseudos import RELEVANCE_CACHE_SIZE, Roster, generate_pseudos, get_relevance, relevance_table
+
+NAMES = [
+    "Marco", "Matteo", "Martina", "Mara", "Andrea", "Anna", "John Adams", "JohnJONES",
+    "MacArthur", "Carlo Carli", "Carla", "EdgarAPoe", "BadNAMEJohn36", "Bob", "Bobby",
+    "42", "_x", "Mia", "Max",
+]
+
+
+class TestPseudos(unittest.TestCase):
+    def test_relevance_cache(self):
+        self.assertEqual(relevance_table("John Adams"), get_relevance("John Adams"))
+        self.assertIs(relevance_table("John Adams"), relevance_table("John Adams"))
+        with self.assertRaises(TypeError):
+            relevance_table("John Adams")["J"] = 0  # type: ignore
+        self.assertEqual(relevance_table.cache_info().maxsize, RELEVANCE_CACHE_SIZE)
+
+    def test_roster(self):
+        rng = random.Random(0)
+        roster, players = Roster(), []
+        for _ in range(300):
+            if players and (len(players) > 12 or rng.random() < 0.4):
+                name = rng.choice(players)
+                players.remove(name)
+                pseudos = roster.remove(name)
+            else:
+                name = rng.choice([n for n in NAMES if n not in players])
+                players.append(name)
+                pseudos = roster.add(name)
+            self.assertEqual(pseudos, generate_pseudos(players))
+        self.assertEqual(Roster(players).pseudos(), generate_pseudos(players))
+
+        roster.add(players[0])
+        self.assertEqual(roster.pseudos(), generate_pseudos(players))
+        with self.assertRaises(KeyError):
+            roster.remove("Nobody")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import random
+import unittest
+from copy import deepcopy
+
+from cattrs.errors import BaseValidationError
+
+from .actions import CaptainAction, GovernorAction, RoleAction, TidyupAction
+from .bots.rufus import Rufus
+from .game import Game
+from .queues import ActionQueue
+
+
+def list_merge(actions: list, extra: list) -> list:
+    """The former `Game.drop_and_merge`, on plain lists."""
+    actions, merged = actions[1:], []
+    i, j = 0, 0
+    while i < len(actions):
+        if j < len(extra) and extra[j].priority > actions[i].priority:
+            merged.append(extra[j])
+            j += 1
+        else:
+            merged.append(actions[i])
+            i += 1
+    return merged + list(extra[j:])
+
+
+class TestActionQueue(unittest.TestCase):
+    def test_stable_merge(self):
+        queue = ActionQueue([CaptainAction("Aa"), TidyupAction("Aa"), GovernorAction("Ba")])
+        extra = [CaptainAction("Ba"), CaptainAction("Ca"), RoleAction("Ba")]
+        expected = list_merge(list(queue), extra)
+        queue.popleft()
+        queue.merge(extra)
+        self.assertEqual(queue, expected)
+        self.assertEqual([queue[i] for i in range(len(queue))], expected)
+        self.assertEqual(queue[-1], GovernorAction("Ba"))
+        with self.assertRaises(ValueError):
+            queue.merge([GovernorAction("Aa"), RoleAction("Aa")])
+        self.assertEqual(queue, expected)  # Nothing queued
+
+    def test_unsorted_games_are_rejected(self):
+        game = Game.start(["Aaron", "Bard", "Carl"], shuffle=False)
+        game.take_action(GovernorAction("Aa"))
+        game.take_action(RoleAction("Aa", role="builder"))
+        unsorted = list(reversed(list(game.actions)))
+        with self.assertRaises(ValueError):
+            ActionQueue(unsorted)
+        with self.assertRaises(ValueError):
+            game.actions = unsorted
+        data = json.loads(game.dumps())
+        data["actions"].reverse()
+        with self.assertRaises(BaseValidationError) as context:
+            Game.loads(json.dumps(data))
+        self.assertIsInstance(context.exception.exceptions[0], ValueError)
+
+    def test_same_queues_as_list_merge(self):
+        rng = random.Random(0)
+        for _ in range(5):
+            game = Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=rng)
+            bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+            reference = list(game.actions)
+            while not game.is_terminal:
+                action = bots[game.expected.name].decide(game)
+                _, extra = action.react(deepcopy(game.board))
+                reference = list_merge(reference, extra)
+                game.step(action)
+                self.assertEqual(list(game.actions), reference)
+
+
+if __name__ == "__main__":
+    unittest.main()
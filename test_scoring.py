@@ -0,0 +1,38 @@
+import random
+import unittest
+
+from .constants import BUILD_INFO, BUILDINGS, TILES
+from .scoring import encode_towns, tally_batch
+from .towns import Town
+from .utils import WorkplaceData
+
+
+def random_town(rng: random.Random) -> Town:
+    town = Town(name="T")
+    town.points = rng.randint(0, 60)
+    town.people = rng.randint(0, 6)
+    for tile in TILES:
+        placed = rng.randint(0, 3)
+        town.tiles[tile] = WorkplaceData(placed, rng.randint(0, placed))
+    for building in BUILDINGS:
+        if rng.random() < 0.4:
+            space = BUILD_INFO[building]["space"]
+            town.buildings[building] = WorkplaceData(1, rng.randint(0, space))
+    return town
+
+
+class TestTallyBatch(unittest.TestCase):
+    def test_matches_tally_details(self):
+        rng = random.Random(0)
+        towns = [random_town(rng) for _ in range(500)]
+        tally = tally_batch(encode_towns(towns))
+        self.assertEqual(tally.shape, (500, 8))
+        for town, row in zip(towns, tally.tolist()):
+            self.assertEqual(tuple(row), town.tally_details())
+
+    def test_empty_batch(self):
+        self.assertEqual(tally_batch(encode_towns([])).shape, (0, 8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import random
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from .bots.rufus import Rufus
+from .game import Game
+from .shared import SharedGamePool
+from .state import decode_state, encode_state
+
+
+def rollout(game: Game) -> list[float]:
+    rng = random.Random(len(game.actions))
+    bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+    while not game.step(bots[game.expected.name].decide(game)):
+        pass
+    return [score for score, *_ in (town.tally_details() for town in game.board.towns.values())]
+
+
+class TestState(unittest.TestCase):
+    def test_roundtrip(self):
+        rng = random.Random(0)
+        for players in (["Aaron", "Bard", "Carl"], ["Aaron", "Bard", "Carl", "Dave", "Earl"]):
+            game = Game.start(players, rng=rng)
+            bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+            while not game.is_terminal:
+                decoded = decode_state(encode_state(game))
+                self.assertEqual(decoded.board, game.board)
+                self.assertEqual(decoded.actions, game.actions)
+                self.assertEqual(decoded.play_order, game.play_order)
+                game.step(bots[game.expected.name].decide(game))
+
+
+class TestSharedGamePool(unittest.TestCase):
+    def test_slots(self):
+        game = Game.start(["Aaron", "Bard", "Carl"])
+        with SharedGamePool(4) as pool:
+            pool[2] = game
+            self.assertEqual(pool[2].board, game.board)
+
+    def test_process_pool_writes_in_place(self):
+        games = [Game.start(["Aaron", "Bard", "Carl", "Dave"], rng=random.Random(i)) for i in range(4)]
+        with SharedGamePool(4) as pool:
+            for i, game in enumerate(games):
+                pool[i] = game
+            with ProcessPoolExecutor(2) as executor:
+                pool.map(rollout, range(4), executor, write_back=True)
+            for i, game in enumerate(games):
+                self.assertTrue(pool[i].is_terminal)
+                self.assertEqual(pool.results[i, :4].tolist(), rollout(game))
+
+
+if __name__ == "__main__":
+    unittest.main()
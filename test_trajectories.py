@@ -0,0 +1,42 @@
+import random
+import tempfile
+import unittest
+
+from .bots.rufus import Rufus
+from .game import Game
+from .trajectories import TrajectoryDataset, TrajectoryRecorder
+
+
+class TestTrajectories(unittest.TestCase):
+    def test_record_and_sample(self):
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = TrajectoryRecorder(directory, shard_size=500, rng=rng)
+            games = []
+            for _ in range(3):
+                game = Game.start(["Aaron", "Bard", "Carl"], rng=rng)
+                bots = {name: Rufus(name, rng=rng) for name in game.play_order}
+                while not recorder.step(game, bots[game.expected.name].decide(game)):
+                    pass
+                games.append(game)
+            recorder.close()
+
+            dataset = TrajectoryDataset(directory)
+            self.assertEqual(len(dataset), sum(len(game.past_actions) for game in games))
+            self.assertGreater(len(dataset.shards), 1)
+
+            first = dataset[0]
+            game = games[0]
+            values = [town.tally_details()[0] for town in game.board.towns.values()]
+            seat = game.play_order.index(game.past_actions[0].name)
+            self.assertEqual(int(first["seats"]), seat)
+            self.assertEqual(first["returns"][:3].tolist(), values[seat:] + values[:seat])
+            self.assertTrue(first["masks"][first["actions"]])
+
+            batch = dataset.sample(32, rng=None)
+            self.assertEqual(batch["observations"].shape[0], 32)
+            self.assertTrue(all(mask[action] for mask, action in zip(batch["masks"], batch["actions"])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,21 @@
 from typing import Optional, overload
 
-from attr import Factory, define
+from attr import Factory, define, field, setters
 
 from .constants import *
+from .counters import Counters, counted
 from .holders import Holder
-from .utils import WorkplaceData, bin_extend, bin_mod
+from .journal import Journal, journaled
+from .utils import WorkplaceData, Workplaces, bin_extend, bin_mod, shallow_copy, to_workplaces
 
+# Where every good comes from, in the order of `GOODS`: its tile, then the
+# buildings that process it (none for corn).
+PRODUCTION_SOURCES: tuple[tuple[Tile, tuple[ProdBuilding, ...]], ...] = tuple(
+    (GOOD_TILES[good], PRODUCTION_BUILDINGS[good]) for good in GOODS
+)
 
-@define
+
+@define(on_setattr=[setters.convert, journaled])
 class Town(Holder):
     name: str
 
@@ -15,7 +23,7 @@ class Town(Holder):
     spent_captain: bool = False
     spent_wharf: bool = False
 
-    role: Optional[Role] = None
+    role: Optional[Role] = field(default=None, on_setattr=[setters.convert, journaled, counted])
 
     money: int = 0
     people: int = 0  # Not counting workers of tiles and buildings.
@@ -26,13 +34,47 @@ class Town(Holder):
     sugar: int = 0
     tobacco: int = 0
 
-    tiles: dict[Tile, WorkplaceData] = Factory(
-        lambda: {tile: WorkplaceData(0, 0) for tile in TILES}
+    tiles: dict[Tile, WorkplaceData] = field(
+        default=Factory(lambda: {tile: WorkplaceData(0, 0) for tile in TILES}),
+        converter=to_workplaces,
+    )
+
+    buildings: dict[Building, WorkplaceData] = field(
+        default=Factory(lambda: {b: WorkplaceData(0, 0) for b in BUILDINGS}),
+        converter=to_workplaces,
+        on_setattr=[setters.convert, journaled, counted],
     )
 
-    buildings: dict[Building, WorkplaceData] = Factory(
-        lambda: {b: WorkplaceData(0, 0) for b in BUILDINGS}
+    # The production vector, with the stamps of the tiles and buildings it comes from
+    _production: Optional[tuple[int, int, tuple[int, ...]]] = field(
+        default=None, init=False, eq=False, repr=False, on_setattr=setters.NO_OP
     )
+    journal: Optional[Journal] = field(
+        default=None, init=False, eq=False, repr=False, on_setattr=setters.NO_OP
+    )
+    # Those of the board, set by it
+    counters: Optional[Counters] = field(
+        default=None, init=False, eq=False, repr=False, on_setattr=setters.NO_OP
+    )
+
+    def journal_path(self) -> tuple[str, ...]:
+        return ("towns", self.name)
+
+    def copy(self) -> "Town":
+        """A copy of the town, much faster than `deepcopy`.
+
+        Workplace entries are shared: they are replaced, never changed.
+        """
+        town = shallow_copy(self)
+        object.__setattr__(town, "tiles", self.tiles.copy())
+        object.__setattr__(town, "buildings", self.buildings.copy())
+        object.__setattr__(town, "journal", None)
+        object.__setattr__(town, "counters", None)
+        return town
+
+    def __deepcopy__(self, memo: dict) -> "Town":
+        copied = memo[id(self)] = self.copy()
+        return copied
 
     def asdict(self) -> dict:
         data = dict()
@@ -51,20 +93,20 @@ class Town(Holder):
         for r in ROLES:
             data[r] = int(self.role == r)
 
-        for tile, data in self.tiles.items():
-            bin_extend(data, f"placed {tile}", data.placed, sup=12)
-            bin_extend(data, f"worked {tile}", data.placed, sup=12)
+        for tile, tile_data in self.tiles.items():
+            bin_extend(data, f"placed {tile}", tile_data.placed, sup=12)
+            bin_extend(data, f"worked {tile}", tile_data.worked, sup=12)
 
         for building in PROD_BUILDINGS:
-            data = self.buildings[building]
-            data[f"{building} placed"] = data.placed
-            data[f"{building} worked %% 1"] = bin_mod(data.worked, 0)
-            data[f"{building} worked %% 2"] = bin_mod(data.worked, 1)
+            building_data = self.buildings[building]
+            data[f"{building} placed"] = building_data.placed
+            data[f"{building} worked %% 1"] = bin_mod(building_data.worked, 0)
+            data[f"{building} worked %% 2"] = bin_mod(building_data.worked, 1)
 
         for building in NONPROD_BUILDINGS:
-            data = self.buildings[building]
-            data[f"{building} placed"] = data.placed
-            data[f"{building} worked"] = data.worked
+            building_data = self.buildings[building]
+            data[f"{building} placed"] = building_data.placed
+            data[f"{building} worked"] = building_data.worked
 
         return data
 
@@ -72,14 +114,9 @@ class Town(Holder):
         return self.tiles["quarry_tile"].worked
 
     def count_active_workers(self, good: Good) -> int:
-        production_buildings = dict(
-            corn=[],
-            indigo=["small_indigo_plant", "indigo_plant"],
-            sugar=["small_sugar_mill", "sugar_mill"],
-            tobacco=["tobacco_storage"],
-            coffee=["coffee_roaster"],
-        )[good]
-        return sum(self.buildings[building].worked for building in production_buildings)
+        return sum(
+            self.buildings[building].worked for building in PRODUCTION_BUILDINGS[good]
+        )
 
     def count_free_build_space(self) -> int:
         total = 12
@@ -133,13 +170,27 @@ class Town(Holder):
 
     def production(self, good: Optional[Good] = None):
         if not good:
-            return {_good: self.production(_good) for _good in GOODS}
-        tile: Tile = f"{good}_tile"  # type: ignore
-        raw_production = self.tiles[tile].worked
-        if good == "corn":
-            return raw_production
-        active_workers = self.count_active_workers(good)
-        return min(raw_production, active_workers)
+            return dict(zip(GOODS, self.production_vector()))
+        return self.production_vector()[GOOD_INDEX[good]]
+
+    def production_vector(self) -> tuple[int, ...]:
+        """What the town produces of every good, in the order of `GOODS`.
+
+        Cached until a tile or a building of the town changes.
+        """
+        tiles: Workplaces = self.tiles  # type: ignore
+        buildings: Workplaces = self.buildings  # type: ignore
+        cached = self._production
+        if cached is not None and cached[0] == tiles.stamp and cached[1] == buildings.stamp:
+            return cached[2]
+        vector = tuple(
+            min(tiles[tile].worked, sum(buildings[b].worked for b in plants))
+            if plants
+            else tiles[tile].worked
+            for tile, plants in PRODUCTION_SOURCES
+        )
+        self._production = (tiles.stamp, buildings.stamp, vector)
+        return vector
 
     def tally_details(self) -> tuple[int, ...]:
         """The value of the town as calculated after game over and its precursors."""
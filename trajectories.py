@@ -0,0 +1,129 @@
+"""Recording of played games as columnar training data.
+
+Every recorded move is a row of the columns below. Rows are written in
+shards of `.npy` files (one per column) by a background thread, and are
+memory-mapped back by `TrajectoryDataset` to sample minibatches.
+"""
+import os
+import random
+import threading
+from queue import Queue
+from typing import Optional
+
+import numpy as np
+
+from .actions import Action
+from .encoding import indexed_possibilities, legal_mask, observation, policy_key
+from .game import Game
+from .state import MAX_PLAYERS
+
+COLUMNS = ("observations", "masks", "actions", "seats", "returns")
+
+
+class TrajectoryRecorder:
+    """Collects the moves of games played through `step` into shards.
+
+    Rows of a game are kept until the game is over, then each one gets the
+    final values (`tally_details()[0]`) of all towns, starting from the
+    acting player.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        shard_size: int = 65536,
+        cap: Optional[int] = 20,
+        rng: Optional[random.Random] = None,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.cap = cap
+        self.rng = rng
+        self.shards = 0
+        self.pending: dict[int, list[tuple]] = {}  # Rows of unfinished games, by id
+        self.rows: list[tuple] = []
+        self.queue: Queue[Optional[tuple[int, list[tuple]]]] = Queue()
+        self.writer = threading.Thread(target=self.write_shards, daemon=True)
+        self.writer.start()
+
+    def step(self, game: Game, action: Action) -> bool:
+        """Record the move, then take it as `Game.step` does."""
+        if game.is_terminal:
+            return True
+        options = indexed_possibilities(game, cap=self.cap, rng=self.rng, include=action)
+        key = policy_key(action)
+        index = next(index for index, option in options.items() if policy_key(option) == key)
+        seat = game.play_order.index(action.name)
+        row = (observation(game), legal_mask(options), index, seat)
+        terminal = game.step(action)
+        self.pending.setdefault(id(game), []).append(row)
+        if not terminal:
+            return False
+
+        values = [town.tally_details()[0] for town in game.board.towns.values()]
+        for obs, mask, index, seat in self.pending.pop(id(game)):
+            returns = np.zeros(MAX_PLAYERS, dtype=np.float32)
+            returns[: len(values)] = values[seat:] + values[:seat]
+            self.rows.append((obs, mask, index, seat, returns))
+        if len(self.rows) >= self.shard_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self.rows:
+            self.queue.put((self.shards, self.rows))
+            self.shards += 1
+            self.rows = []
+
+    def close(self):
+        """Write the rows of finished games and wait for the writer."""
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+
+    def write_shards(self):
+        while (item := self.queue.get()) is not None:
+            shard, rows = item
+            obs, masks, actions, seats, returns = zip(*rows)
+            columns = {
+                "observations": np.stack(obs).astype(np.uint8),
+                "masks": np.stack(masks),
+                "actions": np.array(actions, dtype=np.int32),
+                "seats": np.array(seats, dtype=np.int8),
+                "returns": np.stack(returns),
+            }
+            for column, array in columns.items():
+                path = os.path.join(self.directory, f"shard-{shard:05d}-{column}.npy")
+                with open(path + ".tmp", "wb") as file:
+                    np.save(file, array)
+                os.replace(path + ".tmp", path)
+
+
+class TrajectoryDataset:
+    """Random access to recorded shards without loading them in memory."""
+
+    def __init__(self, directory: str):
+        self.shards: list[dict[str, np.ndarray]] = []
+        # Returns are the last column written, so their shards are complete
+        names = sorted(f for f in os.listdir(directory) if f.endswith("-returns.npy"))
+        for name in names:
+            prefix = os.path.join(directory, name[: -len("returns.npy")])
+            self.shards.append(
+                {column: np.load(f"{prefix}{column}.npy", mmap_mode="r") for column in COLUMNS}
+            )
+        self.offsets = np.cumsum([0] + [len(shard["actions"]) for shard in self.shards])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index: int) -> dict[str, np.ndarray]:
+        shard = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        row = index - self.offsets[shard]
+        return {column: self.shards[shard][column][row] for column in COLUMNS}
+
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None) -> dict[str, np.ndarray]:
+        rng = rng or np.random.default_rng()
+        indices = np.sort(rng.integers(0, len(self), size=batch_size))
+        rows = [self[int(index)] for index in indices]
+        return {column: np.stack([row[column] for row in rows]) for column in COLUMNS}
@@ -1,5 +1,8 @@
 from collections import namedtuple
+import itertools
 import math
+import random
+import threading
 from typing import Generic, List as TypingList, Optional, TypeVar
 
 from attr import define
@@ -20,6 +23,20 @@ def bin_extend(d: dict, label: str, value: int, sup: int):
         log2 += 1
 
 
+def shallow_copy(obj):
+    """A shallow copy of an attrs instance, that skips its converters (unlike `copy.copy`, fast)."""
+    cls = type(obj)
+    copied = object.__new__(cls)
+    for attribute in cls.__attrs_attrs__:
+        object.__setattr__(copied, attribute.name, getattr(obj, attribute.name))
+    return copied
+
+
+def spawn_rngs(seed, n: int) -> list[random.Random]:
+    """Independent random streams, that only depend on the seed and their index."""
+    return [random.Random(f"{seed}/{i}") for i in range(n)]
+
+
 @define
 class ShipData:
     size: int
@@ -27,13 +44,13 @@ class ShipData:
     amount: int
 
 
-@define
+@define(frozen=True)
 class RoleData:
     available: int
     money: int
 
 
-@define
+@define(frozen=True)
 class WorkplaceData:
     placed: int
     worked: int
@@ -42,6 +59,104 @@ class WorkplaceData:
         yield self.placed
         yield self.worked
 
+
+# Every workplaces dict gets a new stamp when created or changed. Stamps are
+# unique across threads, so that caches can also compare those of different dicts.
+_stamps = itertools.count()
+_stamps_lock = threading.Lock()
+
+
+def new_stamp() -> int:
+    with _stamps_lock:
+        return next(_stamps)
+
+
+class Workplaces(dict):
+    """Tiles or buildings of a town, stamped so that towns can cache what they produce.
+
+    Entries are frozen `WorkplaceData`, replaced and never changed in place,
+    and every method that changes the dict takes a new stamp.
+    """
+
+    stamp = -1
+    # Set by `diffs.DiffStream` while it follows the board, never copied
+    journal = None
+    path: tuple[str, ...] = ()
+    # Set on the buildings of a board's towns by `counters.Counters`
+    counters = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stamp = new_stamp()
+
+    def changed(self, *keys):
+        self.stamp = new_stamp()
+        if self.journal is not None:
+            for key in keys:
+                self.journal.note(self.path, key)
+        if self.counters is not None:
+            self.counters.recount(self)
+
+    def __setitem__(self, key, value):
+        # The common change, inlined
+        if self.counters is not None:
+            self.counters.changed(self, key, dict.get(self, key), value)
+        dict.__setitem__(self, key, value)
+        with _stamps_lock:
+            self.stamp = next(_stamps)
+        if self.journal is not None:
+            self.journal.note(self.path, key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed(key)
+
+    def pop(self, key, *default):
+        had = key in self
+        value = super().pop(key, *default)
+        if had:
+            self.changed(key)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.changed(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def clear(self):
+        keys = list(self)
+        super().clear()
+        self.changed(*keys)
+
+    def update(self, *args, **kwargs):
+        entries = dict(*args, **kwargs)
+        super().update(entries)
+        self.changed(*entries)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self) -> "Workplaces":
+        # Same entries, same stamp: what the town produces doesn't change
+        workplaces = Workplaces.__new__(Workplaces)
+        dict.update(workplaces, self)
+        workplaces.stamp = self.stamp
+        return workplaces
+
+    def __reduce__(self):
+        return Workplaces, (dict(self),)
+
+
+def to_workplaces(data: dict) -> Workplaces:
+    return data if isinstance(data, Workplaces) else Workplaces(data)
+
 @define
 class PeopleAssignment:
     holder: PeopleHolder